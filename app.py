@@ -1,17 +1,41 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, url_for, g
 import google.generativeai as genai
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import contextvars
 import json
 import requests
 from datetime import datetime, timedelta
 import time
-from serpapi.google_search import GoogleSearch
+import logging
 import os
+import threading
 from dotenv import load_dotenv
-from flight_deals_scraper import get_flight_deals
+from flight_deals_scraper import get_flight_deals, async_get_flight_deals
 from date_grid_scraper import scrape_google_flights
+from fanout import fan_out, async_fan_out, iter_fan_out_stream, async_fan_out_stream, FANOUT_CALL_TIMEOUT, FANOUT_MAX_CONCURRENCY
+from cache import TTLCache, SQLiteCache, TieredCache, Abandoned, make_key
+from serp_cache import cached_search, async_cached_search, serp_cache, price_band
+from llm_cache import destination_cache, destinations_key, normalize_trip_type, month_bucket
+from fare_dates import fare_index
+from json_stream import JsonArrayStream
+from records import Flight, Hotel, MockRecords, to_dicts, has_mock, flight_index, hotel_index
+from bundles import top_bundles, BUNDLE_TOP_K, MAX_BUNDLE_TOP_K
+from warmup import log_search, start_warmup_thread, WARMUP_RESULT_TTL
+import metrics
+from metrics import timed, configure_logging, set_trace_id
+from resilience import upstream, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # Search routes stay on the threaded pipeline
 
 # Load environment variables
 load_dotenv()
+configure_logging()
 
 app = Flask(__name__)
 
@@ -20,78 +44,215 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel('gemini-2.5-flash-preview-04-17')
 
-# Global variable to store destination data
-destination_data = {}
+# Default origin airport (can be made configurable)
+ORIGIN_AIRPORT = os.getenv('ORIGIN_AIRPORT', 'DFW')  # Dallas/Fort Worth International Airport
+
+# Serve the search routes natively on the ASGI server's event loop (see asgi.py) instead of
+# through the threaded pipeline; needs httpx
+ASYNC_UPSTREAM = os.getenv('ASYNC_UPSTREAM', '1') == '1'
+
+# Demo mode: serve each API's mock data while its SerpApi circuit breaker is open (and no stale
+# copy is kept). Mock records are marked, and results containing them are never cached
+UPSTREAM_MOCK_FALLBACK = os.getenv('UPSTREAM_MOCK_FALLBACK', '0') == '1'
+
+# Per-request timeout for Gemini calls (to the first chunk when streaming), so a hung request
+# fails instead of holding the search. Retries are capped by GEMINI_RETRY_ATTEMPTS
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', 60))
+GEMINI_MAX_WORKERS = int(os.getenv('GEMINI_MAX_WORKERS', 16))
+
+# Suggested when no destinations could be found
+DEFAULT_DESTINATION = {"city": "Dallas", "airport_code": "DFW", "activities": "Default activities"}
+
+# Largest flexible-date window (days either side) a search may request
+MAX_DATE_FLEX = int(os.getenv('MAX_DATE_FLEX', 3))
+
+# Search results keyed by search ID, shared by all requests in this process
+search_cache = TTLCache(
+    max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 64)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 30 * 60)),
+    max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+)
+
+# Full hotel lists fetched on demand for deferred searches, keyed by search ID and city
+hotel_cache = TTLCache(
+    max_entries=int(os.getenv('HOTEL_CACHE_MAX_ENTRIES', 512)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 30 * 60))
+)
 
-# Global variable to store trip details
-trip_details = {
-    'vacation_type': '',
-    'travel_date': '',
-    'budget': 300,
-    'vacation_length': 7
-}
+# Hotel loading for the overview: 'full' fetches every destination's hotels up front,
+# 'deferred' fetches them when a destination is opened
+HOTEL_MODES = ('full', 'deferred')
+# Number of cheapest destinations whose hotels are prefetched after a deferred search
+HOTEL_PREFETCH_TOP_N = int(os.getenv('HOTEL_PREFETCH_TOP_N', 3))
+
+# Generated itineraries keyed by a hash of their prompt; set ITINERARY_CACHE_PATH to keep them on disk
+ITINERARY_CACHE_PATH = os.getenv('ITINERARY_CACHE_PATH', '')
+itinerary_cache = TieredCache(
+    TTLCache(
+        max_entries=int(os.getenv('ITINERARY_CACHE_MAX_ENTRIES', 256)),
+        ttl=float(os.getenv('ITINERARY_CACHE_TTL', 24 * 60 * 60))
+    ),
+    SQLiteCache(ITINERARY_CACHE_PATH, ttl=float(os.getenv('ITINERARY_CACHE_TTL', 24 * 60 * 60)),
+                table='itineraries') if ITINERARY_CACHE_PATH else None
+)
 
 # API classes
 class FlightAPI:
-    def __init__(self):
+    def __init__(self, timeout=None):
         self.api_key = os.getenv('SERP_API_KEY') # Replace with your actual SerpApi key
         # self.api_key = "your_api_key_here"
+        self.timeout = timeout  # Per-request HTTP timeout in seconds
 
     def get_flights(self, origin, destination, date, max_price=None):
         try:
             all_flights = []
             base_date = datetime.strptime(date, "%Y-%m-%d")
             dates = [
-                # (base_date - timedelta(days=1)).strftime("%Y-%m-%d"),
+                # Use get_flights_window for the surrounding days
                 base_date.strftime("%Y-%m-%d")
-                # (base_date + timedelta(days=1)).strftime("%Y-%m-%d")
             ]
             
             for search_date in dates:
-                formatted_date = datetime.strptime(search_date, "%Y-%m-%d").strftime("%Y-%m-%d")
-                params = {
-                    "engine": "google_flights",
-                    "departure_id": origin,
-                    "arrival_id": destination,
-                    "outbound_date": formatted_date,
-                    "type": "2",
-                    "currency": "USD",
-                    "hl": "en",
-                    "gl": "us",
-                    "api_key": self.api_key
-                }
-                
-                if max_price:
-                    params["max_price"] = max_price
-                
-                search = GoogleSearch(params)
-                results = search.get_dict()
-                # print(f"results----{results}")
-                flights = []
-                
-                if "best_flights" in results:
-                    for flight_option in results["best_flights"]:
-                        flight = self._extract_flight_details(flight_option)
-                        flight['date'] = search_date
-                        flights.append(flight)
-                
-                if "other_flights" in results:
-                    for flight_option in results["other_flights"]:
-                        flight = self._extract_flight_details(flight_option)
-                        flight['date'] = search_date
-                        flights.append(flight)
-                
-                all_flights.extend(flights)
+                all_flights.extend(self._search_date(origin, destination, search_date, max_price))
             
             if not all_flights:
-                print(f"No flights found for {origin} to {destination} around {date}")
+                logger.info(f"No flights found for {origin} to {destination} around {date}")
                 return []
                 
             return all_flights
         except Exception as e:
-            print(f"Error fetching flights: {str(e)}")
+            logger.error(f"Error fetching flights: {str(e)}")
+            return []
+    
+    def get_flights_window(self, origin, destination, center_date, radius=1, max_price=None):
+        """Search every date within ``radius`` days of ``center_date`` concurrently and return one
+        price-sorted list with identical itineraries merged (cheapest fare kept)"""
+        try:
+            dates = self._window_dates(center_date, radius)
+            results = fan_out({
+                search_date: lambda search_date=search_date: self._search_date(origin, destination, search_date, max_price)
+                for search_date in dates
+            }, default=[])
+            
+            all_flights = self._merge_dates(dates, results)
+            if not all_flights:
+                logger.info(f"No flights found for {origin} to {destination} within {radius} days of {center_date}")
+            return all_flights
+        except Exception as e:
+            logger.error(f"Error fetching flights: {str(e)}")
+            return []
+    
+    async def get_flights_async(self, client, origin, destination, date, max_price=None):
+        """Async counterpart of get_flights, sending the SerpApi request through ``client``"""
+        try:
+            all_flights = await self._search_date_async(client, origin, destination, date, max_price)
+            if not all_flights:
+                logger.info(f"No flights found for {origin} to {destination} around {date}")
+            return all_flights
+        except Exception as e:
+            logger.error(f"Error fetching flights: {str(e)}")
+            return []
+    
+    async def get_flights_window_async(self, client, origin, destination, center_date, radius=1, max_price=None):
+        """Async counterpart of get_flights_window"""
+        try:
+            dates = self._window_dates(center_date, radius)
+            results = await async_fan_out({
+                search_date: lambda search_date=search_date: self._search_date_async(
+                    client, origin, destination, search_date, max_price)
+                for search_date in dates
+            }, default=[])
+            
+            all_flights = self._merge_dates(dates, results)
+            if not all_flights:
+                logger.info(f"No flights found for {origin} to {destination} within {radius} days of {center_date}")
+            return all_flights
+        except Exception as e:
+            logger.error(f"Error fetching flights: {str(e)}")
             return []
     
+    def _window_dates(self, center_date, radius):
+        base_date = datetime.strptime(center_date, "%Y-%m-%d")
+        return [
+            (base_date + timedelta(days=offset)).strftime("%Y-%m-%d")
+            for offset in range(-radius, radius + 1)
+        ]
+    
+    def _merge_dates(self, dates, results):
+        """Deduplicate identical itineraries across dates, keeping the cheapest, sorted by price"""
+        unique_flights = {}
+        for search_date in dates:
+            for flight in results[search_date]:
+                key = (flight.airline, flight.flight_no, flight.departure, flight.arrival, flight.connection_info)
+                if key not in unique_flights or flight.price < unique_flights[key].price:
+                    unique_flights[key] = flight
+        
+        flights = sorted(unique_flights.values(), key=lambda f: f.price)
+        return MockRecords(flights) if any(has_mock(results[search_date]) for search_date in dates) else flights
+    
+    def _search_date(self, origin, destination, search_date, max_price=None):
+        """Run one SerpApi flight search for a single outbound date"""
+        params = self._search_params(origin, destination, search_date, max_price)
+        try:
+            results = cached_search(params, timeout=self.timeout)
+        except CircuitOpenError as e:
+            return self._fallback(e, search_date, max_price)
+        # print(f"results----{results}")
+        return self._parse_results(results, search_date, max_price)
+    
+    async def _search_date_async(self, client, origin, destination, search_date, max_price=None):
+        params = self._search_params(origin, destination, search_date, max_price)
+        try:
+            results = await async_cached_search(params, client, timeout=self.timeout)
+        except CircuitOpenError as e:
+            return self._fallback(e, search_date, max_price)
+        return self._parse_results(results, search_date, max_price)
+    
+    def _fallback(self, error, search_date, max_price=None):
+        if not UPSTREAM_MOCK_FALLBACK:
+            raise error
+        logger.warning(f"Serving mock flights: {str(error)}")
+        return MockRecords(flight for flight in self._get_mock_data(search_date) if not max_price or flight.price <= max_price)
+    
+    def _search_params(self, origin, destination, search_date, max_price=None):
+        formatted_date = datetime.strptime(search_date, "%Y-%m-%d").strftime("%Y-%m-%d")
+        params = {
+            "engine": "google_flights",
+            "departure_id": origin,
+            "arrival_id": destination,
+            "outbound_date": formatted_date,
+            "type": "2",
+            "currency": "USD",
+            "hl": "en",
+            "gl": "us",
+            "api_key": self.api_key
+        }
+        
+        if max_price:
+            params["max_price"] = price_band(max_price)
+        return params
+    
+    def _parse_results(self, results, search_date, max_price=None):
+        flights = []
+        
+        if "best_flights" in results:
+            for flight_option in results["best_flights"]:
+                flight = self._extract_flight_details(flight_option)
+                flight.date = search_date
+                flights.append(flight)
+        
+        if "other_flights" in results:
+            for flight_option in results["other_flights"]:
+                flight = self._extract_flight_details(flight_option)
+                flight.date = search_date
+                flights.append(flight)
+        
+        # The request used a banded max_price, so apply the exact budget here
+        if max_price:
+            flights = [flight for flight in flights if flight.price <= max_price]
+        
+        return flights
+    
     def _extract_flight_details(self, flight_option):
         """Extract flight details from a flight option in the SerpApi response"""
         # Get the first flight segment for departure and arrival times
@@ -111,152 +272,174 @@ class FlightAPI:
         if len(flight_option.get("flights", [])) > 1:
             connection_info = f" (via {flight_option.get('layovers', [{}])[0].get('name', 'Unknown')})"
         
-        return {
-            "airline": airline,
-            "flight_no": flight_no,
-            "departure": departure_airport.get("time", "N/A"),
-            "arrival": arrival_airport.get("time", "N/A"),
-            "price": flight_option.get("price", 0),
-            "aircraft": first_flight.get("airplane", "N/A"),
-            "duration": self._format_duration(flight_option.get("total_duration", 0)),
-            "connection_info": connection_info
-        }
-    
-    def _format_duration(self, minutes):
-        """Convert minutes to a formatted duration string (e.g., '2h 30m')"""
-        if not minutes:
-            return "N/A"
-        
-        hours = minutes // 60
-        remaining_minutes = minutes % 60
-        
-        if hours > 0 and remaining_minutes > 0:
-            return f"{hours}h {remaining_minutes}m"
-        elif hours > 0:
-            return f"{hours}h"
-        else:
-            return f"{remaining_minutes}m"
+        return Flight(
+            airline=airline,
+            flight_no=flight_no,
+            departure=departure_airport.get("time", "N/A"),
+            arrival=arrival_airport.get("time", "N/A"),
+            price=flight_option.get("price", 0),
+            aircraft=first_flight.get("airplane", "N/A"),
+            duration_minutes=flight_option.get("total_duration", 0) or 0,
+            connection_info=connection_info,
+            stops=max(len(flight_option.get("flights", [])) - 1, 0)
+        )
     
-    def _get_mock_data(self):
+    def _get_mock_data(self, search_date=""):
         # Return mock flight data in case of API errors
         return [
-            {
-                "airline": "Mock Airlines",
-                "flight_no": "MA123",
-                "departure": "10:00 AM",
-                "arrival": "1:00 PM",
-                "price": 250,
-                "aircraft": "Boeing 737",
-                "duration": "3h 0m",
-                "connection_info": ""
-            },
-            {
-                "airline": "Mock Airlines",
-                "flight_no": "MA456",
-                "departure": "2:00 PM",
-                "arrival": "5:00 PM",
-                "price": 300,
-                "aircraft": "Airbus A320",
-                "duration": "3h 0m",
-                "connection_info": ""
-            }
+            Flight(
+                airline="Mock Airlines",
+                flight_no="MA123",
+                departure="10:00 AM",
+                arrival="1:00 PM",
+                price=250,
+                aircraft="Boeing 737",
+                duration_minutes=180,
+                date=search_date,
+                mock=True
+            ),
+            Flight(
+                airline="Mock Airlines",
+                flight_no="MA456",
+                departure="2:00 PM",
+                arrival="5:00 PM",
+                price=300,
+                aircraft="Airbus A320",
+                duration_minutes=180,
+                date=search_date,
+                mock=True
+            )
         ]
 
 class HotelAPI:
-    def __init__(self):
+    def __init__(self, timeout=None):
         self.api_key = os.getenv('SERP_API_KEY')
         # self.api_key = "your_api_key_here"
+        self.timeout = timeout  # Per-request HTTP timeout in seconds
+
     def get_hotels(self, date, location, min_rating=3.0, max_price=None, vacation_length=7):
         try:
-            check_in_date = datetime.strptime(date, "%Y-%m-%d")
-            check_out_date = check_in_date + timedelta(days=vacation_length)
-            
-            params = {
-                "engine": "google_hotels",
-                "q": f"hotels in {location}",
-                "check_in_date": check_in_date.strftime("%Y-%m-%d"),
-                "check_out_date": check_out_date.strftime("%Y-%m-%d"),
-                "currency": "USD",
-                "gl": "us",
-                "hl": "en",
-                "api_key": self.api_key
-            }
-            
-            if max_price:
-                params["max_price"] = max_price
-            
-            if min_rating >= 4.5:
-                params["rating"] = "9"  # 4.5+
-            elif min_rating >= 4.0:
-                params["rating"] = "8"  # 4.0+
-            elif min_rating >= 3.5:
-                params["rating"] = "7"  # 3.5+
-            
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            
-            hotels = []
-            if "properties" in results:
-                for property_data in results["properties"]:
-                    price_per_night = property_data.get("rate_per_night", {}).get("extracted_lowest", 0)
-                    total_price = price_per_night * vacation_length
-                    
-                    # Only include hotels where total stay is within budget
-                    if total_price <= max_price * vacation_length:
-                        hotel = self._extract_hotel_details(property_data)
-                        hotel['check_in'] = check_in_date.strftime("%Y-%m-%d")
-                        hotel['check_out'] = check_out_date.strftime("%Y-%m-%d")
-                        hotel['total_price'] = total_price  # Add total price for the entire stay
-                        hotels.append(hotel)
-            
-            if not hotels:
-                print(f"No hotels found in {location} for the specified dates within budget")
-                return []
-                
-            return hotels
+            params = self._search_params(date, location, min_rating, max_price, vacation_length)
+            results = cached_search(params, timeout=self.timeout)
+            return self._parse_results(results, params, location, max_price, vacation_length)
+        except CircuitOpenError as e:
+            return self._fallback(e, params, max_price, vacation_length)
+        except Exception as e:
+            logger.error(f"Error fetching hotels: {str(e)}")
+            return []
+    
+    async def get_hotels_async(self, client, date, location, min_rating=3.0, max_price=None, vacation_length=7):
+        """Async counterpart of get_hotels, sending the SerpApi request through ``client``"""
+        try:
+            params = self._search_params(date, location, min_rating, max_price, vacation_length)
+            results = await async_cached_search(params, client, timeout=self.timeout)
+            return self._parse_results(results, params, location, max_price, vacation_length)
+        except CircuitOpenError as e:
+            return self._fallback(e, params, max_price, vacation_length)
         except Exception as e:
-            print(f"Error fetching hotels: {str(e)}")
+            logger.error(f"Error fetching hotels: {str(e)}")
+            return []
+    
+    def _fallback(self, error, params, max_price, vacation_length):
+        if not UPSTREAM_MOCK_FALLBACK:
+            logger.error(f"Error fetching hotels: {str(error)}")
+            return []
+        logger.warning(f"Serving mock hotels: {str(error)}")
+        hotels = MockRecords()
+        for hotel in self._get_mock_data():
+            if max_price and hotel.price > max_price:
+                continue
+            hotel.check_in = params["check_in_date"]
+            hotel.check_out = params["check_out_date"]
+            hotel.total_price = hotel.price * vacation_length
+            hotels.append(hotel)
+        return hotels
+    
+    def _search_params(self, date, location, min_rating, max_price, vacation_length):
+        check_in_date = datetime.strptime(date, "%Y-%m-%d")
+        check_out_date = check_in_date + timedelta(days=vacation_length)
+        
+        params = {
+            "engine": "google_hotels",
+            "q": f"hotels in {location}",
+            "check_in_date": check_in_date.strftime("%Y-%m-%d"),
+            "check_out_date": check_out_date.strftime("%Y-%m-%d"),
+            "currency": "USD",
+            "gl": "us",
+            "hl": "en",
+            "api_key": self.api_key
+        }
+        
+        if max_price:
+            params["max_price"] = price_band(max_price)
+        
+        if min_rating >= 4.5:
+            params["rating"] = "9"  # 4.5+
+        elif min_rating >= 4.0:
+            params["rating"] = "8"  # 4.0+
+        elif min_rating >= 3.5:
+            params["rating"] = "7"  # 3.5+
+        return params
+    
+    def _parse_results(self, results, params, location, max_price, vacation_length):
+        hotels = []
+        if "properties" in results:
+            for property_data in results["properties"]:
+                price_per_night = property_data.get("rate_per_night", {}).get("extracted_lowest", 0)
+                total_price = price_per_night * vacation_length
+                
+                # Only include hotels where total stay is within budget
+                if total_price <= max_price * vacation_length:
+                    hotel = self._extract_hotel_details(property_data)
+                    hotel.check_in = params["check_in_date"]
+                    hotel.check_out = params["check_out_date"]
+                    hotel.total_price = total_price  # Add total price for the entire stay
+                    hotels.append(hotel)
+        
+        if not hotels:
+            logger.info(f"No hotels found in {location} for the specified dates within budget")
             return []
+            
+        return hotels
     
     def _extract_hotel_details(self, property_data):
         """Extract hotel details from a property in the SerpApi response"""
-        return {
-            "name": property_data.get("name", "Unknown Hotel"),
-            "price": property_data.get("rate_per_night", {}).get("extracted_lowest", 0),
-            "rating": property_data.get("overall_rating", 0),
-            "address": property_data.get("description", "Address not available"),
-            "amenities": property_data.get("amenities", []),
-            "images": [img.get("thumbnail", "") for img in property_data.get("images", [])],
-            "reviews": property_data.get("reviews", 0),
-            "hotel_class": property_data.get("hotel_class", "Not rated"),
-            "location_rating": property_data.get("location_rating", 0)
-        }
+        images = property_data.get("images", [])
+        return Hotel(
+            name=property_data.get("name", "Unknown Hotel"),
+            price=property_data.get("rate_per_night", {}).get("extracted_lowest", 0),
+            rating=property_data.get("overall_rating", 0),
+            address=property_data.get("description", "Address not available"),
+            amenities=tuple(property_data.get("amenities", [])),
+            image=images[0].get("thumbnail", "") if images else "",
+            reviews=property_data.get("reviews", 0),
+            hotel_class=property_data.get("hotel_class", "Not rated"),
+            location_rating=property_data.get("location_rating", 0)
+        )
     
     def _get_mock_data(self):
         # Return mock hotel data in case of API errors
         return [
-            {
-                "name": "Marriott Downtown",
-                "price": 229,
-                "rating": 4.5,
-                "address": "123 Main St",
-                "amenities": ["Pool", "Fitness Center", "Restaurant", "Bar"],
-                "images": [],
-                "reviews": 0,
-                "hotel_class": "4-star",
-                "location_rating": 4.2
-            },
-            {
-                "name": "Hilton Central",
-                "price": 199,
-                "rating": 4.3,
-                "address": "456 Main St",
-                "amenities": ["Free Wi-Fi", "Spa", "Gym"],
-                "images": [],
-                "reviews": 0,
-                "hotel_class": "4-star",
-                "location_rating": 4.0
-            }
+            Hotel(
+                name="Marriott Downtown",
+                price=229,
+                rating=4.5,
+                address="123 Main St",
+                amenities=("Pool", "Fitness Center", "Restaurant", "Bar"),
+                hotel_class="4-star",
+                location_rating=4.2,
+                mock=True
+            ),
+            Hotel(
+                name="Hilton Central",
+                price=199,
+                rating=4.3,
+                address="456 Main St",
+                amenities=("Free Wi-Fi", "Spa", "Gym"),
+                hotel_class="4-star",
+                location_rating=4.0,
+                mock=True
+            )
         ]
 
 # class WeatherAPI:
@@ -277,107 +460,239 @@ class HoustonTravelRAG:
         # self.weather_api = WeatherAPI()
 
     def _get_base_locations(self, trip_type, travel_date):
+        return list(self._iter_base_locations(trip_type, travel_date))
+
+    async def _get_base_locations_async(self, trip_type, travel_date, client=None):
+        return [dest async for dest in self._aiter_base_locations(trip_type, travel_date, client)]
+
+    def _iter_base_locations(self, trip_type, travel_date):
+        """Yield destinations one at a time as Gemini streams them, so each one's flight and
+        hotel lookups can start while the rest of the list is still being generated"""
         try:
-            print(f"\nAttempting to get locations for trip type: {trip_type}")
+            logger.info(f"Attempting to get locations for trip type: {trip_type}")
             
             # Get flight deals data
-            flight_deals = get_flight_deals()
-            for deal in flight_deals:
-                print(f"Title: {deal['title']}, Fare Availability: {deal['fare_availability']}")
-            # Filter deals for Dallas origin and matching travel dates
-            houston_deals = []
-            for deal in flight_deals:
-                if 'Dallas' in deal['title'] or 'DFW' in deal['title']:
-                    # Check if the travel date falls within the fare availability period
-                    fare_availability = deal['fare_availability']
-                    if any(month in fare_availability for month in ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']):
-                        houston_deals.append(deal)
-            
-            # Create context from flight deals
-            deals_context = "\nAvailable Flight Deals from Dallas:\n"
-            for deal in houston_deals:
-                deals_context += f"- {deal['title']}\n"
-                deals_context += f"  Fare Availability: {deal['fare_availability']}\n"
-            
-            prompt = f"""
-            You are a helpful travel assistant. I need you to suggest 20 most popular destination cities for a {trip_type} trip.
-            The user plans to travel on {travel_date}.
-            
-            {deals_context}
-            
-            Please consider the available flight deals that match the travel date when suggesting destinations, but also include other relevant destinations that match the trip type.
-            
-            For each city, provide:
-            1. The city name
-            2. The main airport code (3-letter IATA code)
-            3. A brief list of activities or highlights related to {trip_type} that visitors can enjoy there
+            with timed('deals_scrape', upstream='deals'):
+                flight_deals = get_flight_deals()
+            prompt, cache_key = self._destinations_prompt(trip_type, travel_date, flight_deals)
             
-            Format your response as a JSON array with objects containing 'city', 'airport_code', and 'activities' fields.
-            Do not include any explanations or text outside the JSON array.
-            Do not include multiple JSON arrays - just one array with all destinations.
+            cached_destinations = self._cached_destinations(trip_type, travel_date, cache_key)
+            if cached_destinations:
+                yield from cached_destinations
+                return
             
-            Example format:
-            [
-                {{"city": "Paris", "airport_code": "CDG", "activities": "Visit the Eiffel Tower, explore the Louvre Museum, enjoy French cuisine"}},
-                {{"city": "Tokyo", "airport_code": "NRT", "activities": "Visit temples, enjoy sushi, explore technology districts"}}
-            ]
-            """
-            
-            print("Sending prompt to model...")
-            response = model.generate_content(prompt)
-            output = response.text.strip()
-            print(f"Raw model output: {output}")
-            
-            # Try to parse the response as JSON
-            try:
-                # Find the first complete JSON array in the response
-                import re
-                json_match = re.search(r'\[\s*\{.*?\}\s*\]', output, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    destinations = json.loads(json_str)
-                    print(f"Successfully parsed {len(destinations)} destinations from JSON")
-                    return destinations
-                else:
-                    print("No JSON array found in response")
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {str(e)}")
+            logger.debug("Sending prompt to model...")
+            response = upstream('gemini').call(lambda: generate_content(prompt, 'destinations', stream=True))
+        except Exception as e:
+            logger.exception(f"Error in _iter_base_locations: {str(e)}")
+            yield dict(DEFAULT_DESTINATION)
+            return
+        
+        stream = DestinationStream(self, cache_key)
+        try:
+            for chunk in response:
+                yield from stream.feed(chunk.text)
+        except Exception as e:
+            stream.failed(e)
+        yield from stream.finish()
+
+    async def _aiter_base_locations(self, trip_type, travel_date, client=None):
+        """Async counterpart of _iter_base_locations: deals fetched with ``client`` and the
+        suggestion streamed from the async Gemini API"""
+        try:
+            logger.info(f"Attempting to get locations for trip type: {trip_type}")
             
-            # Fallback to line-by-line parsing if JSON parsing fails
-            destinations = []
-            current_destination = {}
+            with timed('deals_scrape', upstream='deals'):
+                flight_deals = await async_get_flight_deals(client)
+            prompt, cache_key = self._destinations_prompt(trip_type, travel_date, flight_deals)
             
-            lines = output.strip().split('\n')
-            for line in lines:
-                line = line.strip()
-                if line.startswith('DESTINATION'):
-                    if current_destination and 'city' in current_destination and 'airport_code' in current_destination:
-                        destinations.append(current_destination)
-                    current_destination = {}
-                elif line.startswith('CITY:'):
-                    current_destination['city'] = line.replace('CITY:', '').strip()
-                elif line.startswith('AIRPORT:'):
-                    current_destination['airport_code'] = line.replace('AIRPORT:', '').strip()
-                elif line.startswith('ACTIVITIES:'):
-                    current_destination['activities'] = line.replace('ACTIVITIES:', '').strip()
+            cached_destinations = self._cached_destinations(trip_type, travel_date, cache_key)
+            if cached_destinations:
+                for dest in cached_destinations:
+                    yield dest
+                return
             
-            # Add the last destination if it exists
-            if current_destination and 'city' in current_destination and 'airport_code' in current_destination:
-                destinations.append(current_destination)
-                    
-            if destinations:
-                print(f"Successfully parsed {len(destinations)} destinations from line-by-line parsing")
+            logger.debug("Sending prompt to model...")
+            response = await upstream('gemini').acall(
+                lambda: generate_content_async(prompt, 'destinations', stream=True))
+        except Exception as e:
+            logger.exception(f"Error in _aiter_base_locations: {str(e)}")
+            yield dict(DEFAULT_DESTINATION)
+            return
+        
+        stream = DestinationStream(self, cache_key)
+        try:
+            async for chunk in response:
+                for dest in stream.feed(chunk.text):
+                    yield dest
+        except Exception as e:
+            stream.failed(e)
+        for dest in stream.finish():
+            yield dest
+
+    def _destinations_prompt(self, trip_type, travel_date, flight_deals):
+        """Build the destination prompt from the deals, plus the key its answer is cached under"""
+        for deal in flight_deals:
+            logger.debug(f"Title: {deal['title']}, Fare Availability: {deal['fare_availability']}")
+        # Filter deals for Dallas origin and matching travel dates
+        dallas_deals = [deal for deal in flight_deals if 'Dallas' in deal['title'] or 'DFW' in deal['title']]
+        houston_deals = self._deals_on(dallas_deals, travel_date)
+        
+        # Create context from flight deals
+        deals_context = "\nAvailable Flight Deals from Dallas:\n"
+        for deal in houston_deals:
+            deals_context += f"- {deal['title']}\n"
+            deals_context += f"  Fare Availability: {deal['fare_availability']}\n"
+        
+        prompt = f"""
+        You are a helpful travel assistant. I need you to suggest 20 most popular destination cities for a {trip_type} trip.
+        The user plans to travel on {travel_date}.
+        
+        {deals_context}
+        
+        Please consider the available flight deals that match the travel date when suggesting destinations, but also include other relevant destinations that match the trip type.
+        
+        For each city, provide:
+        1. The city name
+        2. The main airport code (3-letter IATA code)
+        3. A brief list of activities or highlights related to {trip_type} that visitors can enjoy there
+        
+        Format your response as a JSON array with objects containing 'city', 'airport_code', and 'activities' fields.
+        Do not include any explanations or text outside the JSON array.
+        Do not include multiple JSON arrays - just one array with all destinations.
+        
+        Example format:
+        [
+            {{"city": "Paris", "airport_code": "CDG", "activities": "Visit the Eiffel Tower, explore the Louvre Museum, enjoy French cuisine"}},
+            {{"city": "Tokyo", "airport_code": "NRT", "activities": "Visit temples, enjoy sushi, explore technology districts"}}
+        ]
+        """
+    
+        # Reuse an earlier suggestion for the same kind of trip, travel month and deal set
+        # (keyed on the deals available any day that month, so dates within it share one answer)
+        month_deals = self._deals_on(dallas_deals, travel_date, whole_month=True)
+        return prompt, destinations_key(trip_type, travel_date, month_deals)
+
+    def _deals_on(self, flight_deals, travel_date, whole_month=False):
+        """Deals whose fares are available on the travel date (any day of its month with
+        ``whole_month``), looked up in the fare interval index; deals without recognizable
+        dates are kept if they mention the travel month"""
+        try:
+            day = datetime.strptime(travel_date, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return flight_deals
+        index = fare_index(flight_deals)
+        if whole_month:
+            first = day.replace(day=1)
+            last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+            dated = index.deals_between(first, last)
+        else:
+            dated = index.deals_on(day)
+        month = day.strftime("%B")
+        return dated + [deal for deal in index.undated if month in deal['fare_availability']]
+
+    def _cached_destinations(self, trip_type, travel_date, cache_key):
+        cached_destinations = destination_cache.get(cache_key)
+        if cached_destinations:
+            logger.info(f"Using cached destinations for '{normalize_trip_type(trip_type)}' in {month_bucket(travel_date)}")
+        return cached_destinations
+
+    def _destinations_from_output(self, text, cache_key):
+        output = text.strip()
+        logger.debug(f"Raw model output: {output}")
+        
+        destinations = self._parse_destinations(output)
+        if destinations:
+            destination_cache.set(cache_key, destinations)
+            return destinations
+        return [dict(DEFAULT_DESTINATION)]
+
+    def _parse_destinations(self, output):
+        """Parse the model's destination list; returns None if nothing could be parsed"""
+        # Try to parse the response as JSON
+        try:
+            # Find the first complete JSON array in the response
+            import re
+            json_match = re.search(r'\[\s*\{.*?\}\s*\]', output, re.DOTALL)
+            if json_match:
+                json_str = json_match.group(0)
+                destinations = json.loads(json_str)
+                logger.info(f"Successfully parsed {len(destinations)} destinations from JSON")
                 return destinations
             else:
-                print("Failed to parse any destinations from response")
-                return [{"city": "Dallas", "airport_code": "DFW", "activities": "Default activities"}]
+                logger.warning("No JSON array found in response")
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON parsing error: {str(e)}")
+        
+        # Fallback to line-by-line parsing if JSON parsing fails
+        destinations = []
+        current_destination = {}
+        
+        lines = output.strip().split('\n')
+        for line in lines:
+            line = line.strip()
+            if line.startswith('DESTINATION'):
+                if current_destination and 'city' in current_destination and 'airport_code' in current_destination:
+                    destinations.append(current_destination)
+                current_destination = {}
+            elif line.startswith('CITY:'):
+                current_destination['city'] = line.replace('CITY:', '').strip()
+            elif line.startswith('AIRPORT:'):
+                current_destination['airport_code'] = line.replace('AIRPORT:', '').strip()
+            elif line.startswith('ACTIVITIES:'):
+                current_destination['activities'] = line.replace('ACTIVITIES:', '').strip()
+        
+        # Add the last destination if it exists
+        if current_destination and 'city' in current_destination and 'airport_code' in current_destination:
+            destinations.append(current_destination)
                 
-        except Exception as e:
-            print(f"Error in _get_base_locations: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            return [{"city": "Dallas", "airport_code": "DFW", "activities": "Default activities"}]
+        if destinations:
+            logger.info(f"Successfully parsed {len(destinations)} destinations from line-by-line parsing")
+            return destinations
+        else:
+            logger.warning("Failed to parse any destinations from response")
+            return None
+
+class DestinationStream:
+    """Destinations parsed out of a streamed Gemini answer as each object completes.
+
+    A complete answer is cached like a non-streamed one. If nothing could be parsed
+    incrementally, the full text goes through _parse_destinations (line-by-line fallback).
+    """
+
+    def __init__(self, rag, cache_key):
+        self.rag = rag
+        self.cache_key = cache_key
+        self.parser = JsonArrayStream()
+        self.chunks = []
+        self.destinations = []
+        self.error = None
+
+    def feed(self, text):
+        self.chunks.append(text)
+        found = []
+        for dest in self.parser.feed(text):
+            if isinstance(dest, dict) and dest.get('city') and dest.get('airport_code'):
+                # The pipeline adds flights and hotels to what it is given; keep the parsed copy clean
+                self.destinations.append(dict(dest))
+                found.append(dest)
+        return found
+
+    def failed(self, error):
+        logger.error(f"Destination stream failed after {len(self.destinations)} destinations: {str(error)}")
+        self.error = error
+
+    def finish(self):
+        """Destinations still to be yielded once the stream has ended"""
+        if self.destinations:
+            logger.info(f"Streamed {len(self.destinations)} destinations")
+            # Only complete answers are cached
+            if self.error is None:
+                destination_cache.set(self.cache_key, self.destinations)
+            return []
+        if self.error is not None:
+            return [dict(DEFAULT_DESTINATION)]
+        return self.rag._destinations_from_output("".join(self.chunks), self.cache_key)
 
 def format_prompt(context, query):
     # Check if we have a single flight or multiple flights
@@ -432,102 +747,586 @@ def index():
 def flights():
     return render_template('flights.html')
 
-@app.route('/get_all_flights', methods=['POST'])
-def get_all_flights():
+def parse_search_params(data):
+    """Normalize the search fields of a request body; raises ValueError, with a message naming
+    the bad field, on bad numbers"""
     try:
-        data = request.json
-        vacation_type = data.get('vacation_type', '')
-        travel_date = data.get('travel_date', '')
-        
-        # Ensure budget and vacation_length are numbers
-        try:
-            total_budget = float(data.get('budget', 300))
-            vacation_length = int(data.get('vacation_length', 7))
-        except (ValueError, TypeError):
-            return jsonify({"error": "Invalid budget or vacation length"}), 400
-        
-        # Split budget: 60% for flights, 40% for hotels
-        flight_budget = int(total_budget * 0.6)
-        hotel_budget = int(total_budget * 0.4) 
-        
-        # Check if we already have the same trip details
-        global trip_details, destination_data
-        if (trip_details['vacation_type'] == vacation_type and 
-            trip_details['travel_date'] == travel_date and 
-            trip_details['budget'] == total_budget and
-            trip_details['vacation_length'] == vacation_length and 
-            destination_data):
-            return jsonify({"destinations": list(destination_data.values())})
-        
-        # Update trip details
-        trip_details = {
-            'vacation_type': vacation_type,
-            'travel_date': travel_date,
-            'budget': total_budget,
-            'vacation_length': vacation_length
+        budget = float(data.get('budget', 300))
+        vacation_length = int(data.get('vacation_length', 7))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid budget or vacation length")
+    try:
+        date_flex = int(data.get('date_flex', 0) or 0)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid date_flex: expected a whole number of days")
+    return {
+        'vacation_type': data.get('vacation_type', '') or '',
+        'travel_date': data.get('travel_date', '') or '',
+        'budget': budget,
+        'vacation_length': vacation_length,
+        'origin': ORIGIN_AIRPORT,
+        # Also search this many days either side of the travel date (capped to bound upstream calls)
+        'date_flex': min(max(date_flex, 0), MAX_DATE_FLEX),
+        'hotel_mode': data.get('hotel_mode') if data.get('hotel_mode') in HOTEL_MODES else 'full'
+    }
+
+def get_search_id(params):
+    """Stable ID for a search, derived from its (vacation_type, travel_date, budget, vacation_length, origin) key"""
+    return make_key(params['vacation_type'], params['travel_date'], params['budget'],
+                    params['vacation_length'], params['origin'], params.get('date_flex', 0),
+                    params.get('hotel_mode', 'full'))[:16]
+
+def hotel_price_cap(params):
+    """Max price per night for hotels: the whole budget spread over the trip. Whether a hotel
+    actually fits depends on the flight it is paired with, which top_bundles decides."""
+    return int(params['budget'] / params['vacation_length'])
+
+def fetch_destination_hotels(params, dest, hotel_api=None):
+    """Hotels in a destination city for a search's dates and budget"""
+    hotel_api = hotel_api or HotelAPI(timeout=FANOUT_CALL_TIMEOUT)
+    return hotel_api.get_hotels(
+        date=params['travel_date'],
+        location=dest['city'],
+        max_price=hotel_price_cap(params),
+        vacation_length=params['vacation_length']
+    )
+
+def summarize_hotels(index):
+    """Price summary of a destination's hotel index for the overview cards"""
+    if not index:
+        return None
+    return {'count': len(index), 'min_total_price': index.min('total_price'),
+            'max_total_price': index.max('total_price')}
+
+def load_hotels(search_id, entry, city):
+    """Fetch a deferred destination's hotels once and store them on its cached search entry"""
+    dest = entry['destinations'][city]
+    if dest.get('hotels') is None:
+        # Concurrent loads of the same city (page view and prefetch) share one upstream call
+        hotels = hotel_cache.get_or_compute(make_key(search_id, city),
+                                            lambda: fetch_destination_hotels(entry['params'], dest),
+                                            cacheable=lambda hotels: not has_mock(hotels))
+        if has_mock(hotels):
+            # Served to this request only, so the real list is fetched once SerpApi is back
+            return hotels
+        entry['indexes'][city]['hotels'] = hotel_index(hotels)
+        dest['hotel_summary'] = summarize_hotels(entry['indexes'][city]['hotels'])
+        dest['hotels'] = hotels
+        # The entry grew in place; count the hotels against the cache's max_bytes
+        search_cache.resize(search_id)
+    return dest['hotels']
+
+def prefetch_hotels(search_id, entry, top_n=HOTEL_PREFETCH_TOP_N):
+    """Load hotels for the ``top_n`` destinations with the cheapest flights in a background thread"""
+    if top_n <= 0 or entry['params'].get('hotel_mode') != 'deferred':
+        return
+    flight_indexes = {city: indexes['flights'] for city, indexes in entry['indexes'].items() if indexes['flights']}
+    cheapest = sorted(flight_indexes, key=lambda city: flight_indexes[city].min('price'))[:top_n]
+    calls = {city: lambda city=city: load_hotels(search_id, entry, city) for city in cheapest}
+    if calls:
+        logger.info(f"Prefetching hotels for {', '.join(calls)}")
+        threading.Thread(target=contextvars.copy_context().run, args=(fan_out, calls),
+                         kwargs={'default': []}, daemon=True).start()
+
+def warm_search(search):
+    """Precompute one popular search into the result cache (used by the warm-up scheduler).
+    Searches default to deferred hotels, matching what the overview page requests."""
+    params = parse_search_params({'hotel_mode': 'deferred', **search})
+    search_id = get_search_id(params)
+    logger.info(f"Warming search {search_id}: {params['vacation_type']} on {params['travel_date']}")
+    entry = search_cache.get_or_compute(search_id, lambda: run_search(params), ttl=WARMUP_RESULT_TTL,
+                                        cacheable=cacheable_search)
+    prefetch_hotels(search_id, entry)
+    return search_id
+
+def make_search_entry(params, destinations):
+    """Cached form of a finished search: its params, the destinations keyed by city and
+    a columnar price index over each destination's flights and hotels"""
+    indexes = {}
+    for dest in destinations:
+        hotels = dest.get('hotels')
+        indexes[dest['city']] = {
+            'flights': flight_index(dest.get('flights')),
+            'hotels': hotel_index(hotels) if hotels is not None else None
         }
-        
-        # Get destination options
-        print("Initializing HoustonTravelRAG...")
-        rag = HoustonTravelRAG()
-        destinations = rag._get_base_locations(vacation_type, travel_date)
-        print(f"Destinations retrieved")
-        
-        # Default origin airport (can be made configurable)
-        origin_airport = "DFW"  # Dallas/Fort Worth International Airport
-        print(f"Using origin airport: {origin_airport}")
-        
-        # Fetch flights and hotels for each destination
-        flight_api = FlightAPI()
-        hotel_api = HotelAPI()
-        for dest in destinations:
-            print(f"Processing destination: {dest['city']} ({dest['airport_code']})")
-            
-            # Fetch flights with flight budget
-            dest['flights'] = flight_api.get_flights(
+    # Searches served any mock data (SerpApi outage) are marked and never cached
+    mock = any(has_mock(dest.get('flights')) or has_mock(dest.get('hotels')) for dest in destinations)
+    return {'params': params, 'destinations': {dest['city']: dest for dest in destinations}, 'indexes': indexes,
+            'mock': mock}
+
+def cacheable_search(entry):
+    return not entry.get('mock')
+
+def destination_to_dict(dest):
+    """JSON-ready copy of a destination; records are only converted here, at the response"""
+    data = dict(dest)
+    data['flights'] = to_dicts(dest.get('flights'))
+    data['hotels'] = to_dicts(dest.get('hotels'))
+    return data
+
+def iter_search_destinations(params):
+    """Run the search pipeline, yielding ('candidate', dest) as Gemini suggests each destination
+    and then ('destination', dest) once that destination's flights and hotels are in. Lookups
+    for a destination start as soon as it is suggested, while Gemini is still generating the
+    rest. In deferred hotel mode only flights are fetched and each destination's hotels are None."""
+    vacation_type = params['vacation_type']
+    travel_date = params['travel_date']
+    total_budget = params['budget']
+    origin_airport = params['origin']
+    deferred = params.get('hotel_mode') == 'deferred'
+    
+    # No fixed flight/hotel split: each side is only capped by the whole budget and
+    # top_bundles picks the pairs that fit together
+    flight_budget = int(total_budget)
+    
+    logger.debug(f"Using origin airport: {origin_airport}")
+    logger.debug(f"Max price per night for hotels: {hotel_price_cap(params)}")
+    
+    flight_api = FlightAPI(timeout=FANOUT_CALL_TIMEOUT)
+    hotel_api = HotelAPI(timeout=FANOUT_CALL_TIMEOUT)
+    destinations = []
+    
+    def calls_for(dest):
+        # Runs as each destination is parsed out of the Gemini stream
+        i = len(destinations)
+        destinations.append(dest)
+        logger.debug(f"Processing destination: {dest['city']} ({dest['airport_code']})")
+        calls = {}
+        if params.get('date_flex'):
+            calls[('flights', i)] = lambda: flight_api.get_flights_window(
                 origin=origin_airport,
                 destination=dest['airport_code'],
-                date=travel_date,
+                center_date=travel_date,
+                radius=params['date_flex'],
                 max_price=flight_budget
             )
-            print(f"Flights found")
-            
-            # Calculate max price per night based on total hotel budget and vacation length
-            max_price_per_night = int(hotel_budget / vacation_length)
-            print(f"Max price per night for hotels: {max_price_per_night}")
-            
-            # Fetch hotels with calculated max price per night
-            dest['hotels'] = hotel_api.get_hotels(
+        else:
+            calls[('flights', i)] = lambda: flight_api.get_flights(
+                origin=origin_airport,
+                destination=dest['airport_code'],
                 date=travel_date,
-                location=dest['city'],
-                max_price=max_price_per_night,
-                vacation_length=vacation_length
+                max_price=flight_budget
             )
-            print(f"Hotels found")
+        if deferred:
+            # Filled in by load_hotels when the destination is opened or prefetched
+            dest['hotels'] = None
+            dest['hotel_summary'] = None
+        else:
+            calls[('hotels', i)] = lambda: fetch_destination_hotels(params, dest, hotel_api)
+        return calls
+    
+    rag = HoustonTravelRAG()
+    source = rag._iter_base_locations(vacation_type, travel_date)
+    for event, value in iter_fan_out_stream(source, calls_for, default=[]):
+        if event == 'item':
+            yield 'candidate', value
+            continue
+        # A destination is complete once both its flights and its hotels are in
+        (kind, i), result = value
+        dest = destinations[i]
+        dest[kind] = result
+        if 'flights' in dest and 'hotels' in dest:
+            yield 'destination', dest
+    logger.info("Flights found" if deferred else "Flights and hotels found")
+
+def search_destinations(params):
+    """Run the full search pipeline and return its cache entry (see make_search_entry)"""
+    destinations = []
+    for event, value in iter_search_destinations(params):
+        if event == 'candidate':
+            destinations.append(value)
+    return make_search_entry(params, destinations)
+
+def make_async_client():
+    """Pooled HTTP client for the async pipeline, sized to the fan-out's concurrency"""
+    limits = httpx.Limits(max_connections=FANOUT_MAX_CONCURRENCY, max_keepalive_connections=FANOUT_MAX_CONCURRENCY)
+    return httpx.AsyncClient(limits=limits, follow_redirects=True)
+
+async def aiter_search_destinations(params, client):
+    """Async counterpart of iter_search_destinations: the deals scrape, the Gemini stream and every
+    SerpApi request are coroutines on the running event loop, sharing ``client``"""
+    travel_date = params['travel_date']
+    origin_airport = params['origin']
+    deferred = params.get('hotel_mode') == 'deferred'
+    flight_budget = int(params['budget'])
+    
+    flight_api = FlightAPI(timeout=FANOUT_CALL_TIMEOUT)
+    hotel_api = HotelAPI(timeout=FANOUT_CALL_TIMEOUT)
+    destinations = []
+    
+    def calls_for(dest):
+        i = len(destinations)
+        destinations.append(dest)
+        calls = {}
+        if params.get('date_flex'):
+            calls[('flights', i)] = lambda: flight_api.get_flights_window_async(
+                client, origin_airport, dest['airport_code'], travel_date,
+                radius=params['date_flex'], max_price=flight_budget)
+        else:
+            calls[('flights', i)] = lambda: flight_api.get_flights_async(
+                client, origin_airport, dest['airport_code'], travel_date, max_price=flight_budget)
+        if deferred:
+            dest['hotels'] = None
+            dest['hotel_summary'] = None
+        else:
+            calls[('hotels', i)] = lambda: hotel_api.get_hotels_async(
+                client, travel_date, dest['city'], max_price=hotel_price_cap(params),
+                vacation_length=params['vacation_length'])
+        return calls
+    
+    rag = HoustonTravelRAG()
+    source = rag._aiter_base_locations(params['vacation_type'], travel_date, client)
+    events = async_fan_out_stream(source, calls_for, default=[])
+    try:
+        async for event, value in events:
+            if event == 'item':
+                yield 'candidate', value
+                continue
+            (kind, i), result = value
+            dest = destinations[i]
+            dest[kind] = result
+            if 'flights' in dest and 'hotels' in dest:
+                yield 'destination', dest
+    finally:
+        # Cancels the lookups still running if the consumer stopped early
+        await events.aclose()
+    logger.info("Flights found" if deferred else "Flights and hotels found")
+
+async def async_search_destinations(params, client):
+    """Async counterpart of search_destinations"""
+    destinations = []
+    events = aiter_search_destinations(params, client)
+    try:
+        async for event, value in events:
+            if event == 'candidate':
+                destinations.append(value)
+    finally:
+        await events.aclose()
+    return make_search_entry(params, destinations)
+
+def run_search(params):
+    """Run a search to completion on the threaded pipeline (asgi.py serves the async one)"""
+    with timed('search', mode=params.get('hotel_mode', 'full')):
+        return search_destinations(params)
+
+def join_search(search_id):
+    """Cached entry for a search, waiting for an identical one already running. Returns
+    (entry, leader); entry is None only for the leader, which must run the search and
+    release ``search_id`` in search_cache."""
+    while True:
+        entry = search_cache.get(search_id)
+        if entry is not None:
+            return entry, False
+        future, leader = search_cache.claim(search_id)
+        if leader:
+            return None, True
+        try:
+            return future.result(), False
+        except Exception:
+            # The leader failed or its client went away; try again, possibly as leader
+            continue
+
+async def async_join_search(search_id):
+    """join_search without blocking the event loop while an identical search finishes"""
+    while True:
+        entry = search_cache.get(search_id)
+        if entry is not None:
+            return entry, False
+        future, leader = search_cache.claim(search_id)
+        if leader:
+            return None, True
+        try:
+            # Shielded so a follower that goes away doesn't cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future)), False
+        except Exception:
+            continue
+
+def release_search(search_id, error):
+    # Includes GeneratorExit and CancelledError when the client disconnects; waiting requests take over
+    search_cache.release(search_id, error=error if isinstance(error, Exception) else Abandoned("search abandoned"))
+
+def search_results(search_id, entry):
+    """/get_all_flights response body for a finished search"""
+    return {"destinations": [destination_to_dict(dest) for dest in entry['destinations'].values()],
+            "search_id": search_id, "mock": entry.get('mock', False)}
+
+def ndjson(event_type, **fields):
+    """One event line of /get_all_flights_stream"""
+    return json.dumps({"type": event_type, **fields}) + "\n"
+
+def replay_search(entry):
+    """Event lines for a search that has already finished"""
+    destinations = list(entry['destinations'].values())
+    yield ndjson("destinations", destinations=[destination_to_dict(dest) for dest in destinations])
+    for dest in destinations:
+        yield ndjson("destination", destination=destination_to_dict(dest))
+
+def search_event(event, dest):
+    """Event line for a ('candidate' | 'destination', dest) pair from the search pipeline"""
+    if event == 'candidate':
+        return ndjson("candidate", destination={k: dest[k] for k in ('city', 'airport_code', 'activities') if k in dest})
+    return ndjson("destination", destination=destination_to_dict(dest))
+
+async def async_get_all_flights(params, search_id, client):
+    """/get_all_flights response body, computed on the running event loop (served by asgi.py)"""
+    entry, leader = await async_join_search(search_id)
+    if leader:
+        try:
+            with timed('search', mode=params.get('hotel_mode', 'full')):
+                entry = await async_search_destinations(params, client)
+        except BaseException as e:
+            release_search(search_id, e)
+            raise
+        search_cache.release(search_id, entry, store=cacheable_search(entry))
+    logger.info(f"Destination data stored for search {search_id}")
+    prefetch_hotels(search_id, entry)
+    return search_results(search_id, entry)
+
+async def async_search_stream(params, search_id, client):
+    """/get_all_flights_stream event lines, produced on the running event loop (served by asgi.py)"""
+    yield ndjson("search", search_id=search_id)
+    try:
+        entry, leader = await async_join_search(search_id)
+        if not leader:
+            for line in replay_search(entry):
+                yield line
+        else:
+            try:
+                destinations = []
+                events = aiter_search_destinations(params, client)
+                try:
+                    async for event, value in events:
+                        if event == 'candidate':
+                            destinations.append(value)
+                        yield search_event(event, value)
+                finally:
+                    await events.aclose()
+                entry = make_search_entry(params, destinations)
+            except BaseException as e:
+                release_search(search_id, e)
+                raise
+            search_cache.release(search_id, entry, store=cacheable_search(entry))
+            logger.info(f"Destination data stored for search {search_id}")
+            prefetch_hotels(search_id, entry)
+        yield ndjson("done", mock=entry.get('mock', False))
+    except Exception as e:
+        logger.error(f"Error in get_all_flights_stream: {str(e)}")
+        yield ndjson("error", error="An error occurred while processing the request")
+
+@app.route('/get_all_flights', methods=['POST'])
+def get_all_flights():
+    try:
+        data = request.json
         
-        # Store the destinations data globally
-        destination_data = {dest['city']: dest for dest in destinations}
-        print(f"Destination data stored")
+        # Ensure budget, vacation_length and date_flex are numbers
+        try:
+            params = parse_search_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        return jsonify({"destinations": destinations})
+        # Identical searches share one cache entry; concurrent ones share one computation
+        search_id = get_search_id(params)
+        log_search(params)
+        entry = search_cache.get_or_compute(search_id, lambda: run_search(params), cacheable=cacheable_search)
+        logger.info(f"Destination data stored for search {search_id}")
+        prefetch_hotels(search_id, entry)
+        
+        return jsonify(search_results(search_id, entry))
     except Exception as e:
-        print(f"Error in get_all_flights: {str(e)}")
+        logger.error(f"Error in get_all_flights: {str(e)}")
         return jsonify({"error": "An error occurred while processing the request"}), 500
 
+@app.route('/get_all_flights_stream', methods=['POST'])
+def get_all_flights_stream():
+    """Streaming variant of /get_all_flights: newline-delimited JSON events, with a 'candidate'
+    event as Gemini suggests each destination and a 'destination' event as its flights and
+    hotels arrive (a cached search sends the whole 'destinations' list up front instead)"""
+    data = request.json
+    try:
+        params = parse_search_params(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    search_id = get_search_id(params)
+    log_search(params)
+    
+    def generate():
+        yield ndjson("search", search_id=search_id)
+        try:
+            # Identical searches already running are joined: wait for the leader, then replay
+            entry, leader = join_search(search_id)
+            if not leader:
+                yield from replay_search(entry)
+            else:
+                try:
+                    destinations = []
+                    for event, value in iter_search_destinations(params):
+                        if event == 'candidate':
+                            destinations.append(value)
+                        yield search_event(event, value)
+                    entry = make_search_entry(params, destinations)
+                except BaseException as e:
+                    release_search(search_id, e)
+                    raise
+                search_cache.release(search_id, entry, store=cacheable_search(entry))
+                logger.info(f"Destination data stored for search {search_id}")
+                prefetch_hotels(search_id, entry)
+            yield ndjson("done", mock=entry.get('mock', False))
+        except Exception as e:
+            logger.error(f"Error in get_all_flights_stream: {str(e)}")
+            yield ndjson("error", error="An error occurred while processing the request")
+    
+    # Disable proxy buffering so each line reaches the browser as soon as it is written
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+# Sort keys accepted by /get_destination_flights, mapped to their index columns
+FLIGHT_SORTS = {'price': 'price', 'duration': 'duration_minutes'}
+HOTEL_SORTS = {'price': 'price', 'rating': 'rating', 'price_per_star': 'price_per_star'}
+# Largest page /get_destination_flights returns in one response
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+
+def parse_result_query(data):
+    """Normalize the sort, filter and paging fields of a /get_destination_flights request;
+    raises ValueError on an unknown sort key or a bad number"""
+    def number(name, cast=float):
+        value = data.get(name)
+        return cast(value) if value not in (None, '') else None
+    
+    def sort_key(name, sorts):
+        value = (data.get(name) or data.get('sort') or '').replace('-', '_')
+        if value and value not in FLIGHT_SORTS and value not in HOTEL_SORTS:
+            raise ValueError(f"Unknown sort key: {value}")
+        # A shared sort key that doesn't apply to this list (e.g. rating for flights) is ignored
+        return value if value in sorts else None
+    
+    limit = number('limit', int)
+    return {
+        'flight_sort': sort_key('flight_sort', FLIGHT_SORTS),
+        'hotel_sort': sort_key('hotel_sort', HOTEL_SORTS),
+        'order': data.get('order'),
+        'max_stops': number('max_stops', int),
+        'airline': (data.get('airline') or '').strip().lower(),
+        'min_rating': number('min_rating'),
+        'max_total_price': number('max_total_price'),
+        'offset': max(number('offset', int) or 0, 0),
+        'limit': min(max(limit, 0), MAX_PAGE_SIZE) if limit is not None else None
+    }
+
+def query_destination(entry, city, query):
+    """Filtered, sorted page of a destination's flights and hotels, served from its price index"""
+    indexes = entry['indexes'][city]
+    flights, hotels = indexes['flights'], indexes['hotels'] or hotel_index([])
+    
+    flight_masks = []
+    if query['max_stops'] is not None:
+        flight_masks.append(flights.mask('stops', high=query['max_stops']))
+    if query['airline']:
+        flight_masks.append([query['airline'] in flight.airline.lower() for flight in flights.records])
+    hotel_masks = []
+    if query['min_rating'] is not None:
+        hotel_masks.append(hotels.mask('rating', low=query['min_rating']))
+    
+    # A flight fits the total budget if it leaves room for the cheapest matching hotel, and vice versa
+    if query['max_total_price'] is not None:
+        cheapest_flight = min((price for i, price in enumerate(flights.columns['price'])
+                               if all(mask[i] for mask in flight_masks)), default=0)
+        cheapest_hotel = min((price for i, price in enumerate(hotels.columns['total_price'])
+                              if all(mask[i] for mask in hotel_masks)), default=0)
+        flight_masks.append(flights.mask('price', high=query['max_total_price'] - cheapest_hotel))
+        hotel_masks.append(hotels.mask('total_price', high=query['max_total_price'] - cheapest_flight))
+    
+    def page(index, sort, sorts, masks):
+        # Ratings read best-first unless the caller asks otherwise
+        descending = query['order'] == 'desc' if query['order'] else sort == 'rating'
+        return index.query(sorts[sort] if sort else None, descending, masks, query['offset'], query['limit'])
+    
+    flight_total, flight_page = page(flights, query['flight_sort'], FLIGHT_SORTS, flight_masks)
+    hotel_total, hotel_page = page(hotels, query['hotel_sort'], HOTEL_SORTS, hotel_masks)
+    return {
+        "flights": to_dicts(flight_page),
+        "hotels": to_dicts(hotel_page),
+        "flight_total": flight_total,
+        "hotel_total": hotel_total,
+        "offset": query['offset'],
+        "limit": query['limit']
+    }
+
 @app.route('/get_destination_flights', methods=['POST'])
 def get_destination_flights():
     data = request.json
     city = data.get('city', '')
     
-    # Get the stored destination data
-    global destination_data
-    if city in destination_data:
-        return jsonify({
-            "flights": destination_data[city].get('flights', []),
-            "hotels": destination_data[city].get('hotels', [])
-        })
+    try:
+        query = parse_result_query(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Look up the search by ID, falling back to the ID derived from the trip details
+    search_id = data.get('search_id')
+    if not search_id:
+        try:
+            search_id = get_search_id(parse_search_params(data))
+        except (ValueError, TypeError):
+            search_id = None
+    
+    entry = search_cache.get(search_id) if search_id else None
+    if entry and city in entry['destinations']:
+        # Deferred searches fetch the city's hotels now, using the search's own params
+        try:
+            hotels = load_hotels(search_id, entry, city)
+        except Exception as e:
+            logger.error(f"Error loading hotels for {city}: {str(e)}")
+            hotels = None
+        if has_mock(hotels):
+            # Mock hotels aren't kept on the cached search; query them on a copy for this response
+            indexes = {**entry['indexes'], city: {**entry['indexes'][city], 'hotels': hotel_index(hotels)}}
+            entry = {**entry, 'indexes': indexes}
+        return jsonify(query_destination(entry, city, query))
     else:
-        return jsonify({"flights": [], "hotels": []})
+        return jsonify({"flights": [], "hotels": [], "flight_total": 0, "hotel_total": 0,
+                        "offset": query['offset'], "limit": query['limit']})
+
+@app.route('/get_bundles', methods=['POST'])
+def get_bundles():
+    """Cheapest flight + hotel bundles within the total budget across all of a search's destinations"""
+    data = request.json
+    try:
+        k = min(max(int(data.get('k', BUNDLE_TOP_K)), 1), MAX_BUNDLE_TOP_K)
+        max_per_destination = int(data['max_per_destination']) if data.get('max_per_destination') else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid k or max_per_destination"}), 400
+    
+    search_id = data.get('search_id')
+    if not search_id:
+        try:
+            search_id = get_search_id(parse_search_params(data))
+        except (ValueError, TypeError):
+            search_id = None
+    
+    entry = search_cache.get(search_id) if search_id else None
+    if not entry:
+        return jsonify({"bundles": []})
+    
+    # Deferred searches need every destination's hotels before they can be paired
+    missing = [city for city, indexes in entry['indexes'].items()
+               if indexes['hotels'] is None and indexes['flights']]
+    if missing:
+        fan_out({city: lambda city=city: load_hotels(search_id, entry, city) for city in missing}, default=[])
+    
+    budget = entry['params']['budget']
+    bundles = top_bundles(entry['indexes'], budget, k, max_per_destination)
+    return jsonify({"bundles": [
+        {
+            "city": city,
+            "airport_code": entry['destinations'][city].get('airport_code'),
+            "flight": flight.to_dict(),
+            "hotel": hotel.to_dict(),
+            "total_price": total,
+            "remaining_budget": budget - total
+        }
+        for total, city, flight, hotel in bundles
+    ]})
 
 @app.route('/destination_flights')
 def destination_flights():
@@ -542,11 +1341,13 @@ def destination_flights():
                          travel_date=travel_date,
                          budget=budget)
 
-@app.route('/generate_itinerary', methods=['GET'])
-def generate_itinerary_get():
-    city = request.args.get('city', '')
-    airport_code = request.args.get('airport_code', '')
-    flight_data = request.args.get('flight_data', '{}')
+ITINERARY_ERROR_MESSAGE = "Sorry, there was an error generating your itinerary. Please try again."
+
+def itinerary_request_from_args(args):
+    """Build the itinerary prompt and page details from the GET /generate_itinerary query string"""
+    city = args.get('city', '')
+    airport_code = args.get('airport_code', '')
+    flight_data = args.get('flight_data', '{}')
     
     try:
         flight = json.loads(flight_data)
@@ -554,9 +1355,9 @@ def generate_itinerary_get():
         flight = {}
     
     # Get other parameters from session or default values
-    vacation_type = request.args.get('vacation_type', 'vacation')
-    travel_date = request.args.get('travel_date', datetime.now().strftime("%Y-%m-%d"))
-    budget = request.args.get('budget', 300)
+    vacation_type = args.get('vacation_type', 'vacation')
+    travel_date = args.get('travel_date', datetime.now().strftime("%Y-%m-%d"))
+    budget = args.get('budget', 300)
     
     # Create a context object with the flight data
     selected_flight = {
@@ -577,10 +1378,104 @@ def generate_itinerary_get():
         "max_price": budget,
         "selected_flight": selected_flight
     })
+    return prompt, city, vacation_type, travel_date
+
+# google-generativeai 0.3.2 has no per-request timeout option, so blocking Gemini calls run
+# here and the caller stops waiting after GEMINI_TIMEOUT
+gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix='gemini')
+
+def call_gemini(prompt, stream=False):
+    """``model.generate_content`` bounded by GEMINI_TIMEOUT (to the first chunk when streaming)"""
+    future = gemini_executor.submit(contextvars.copy_context().run, model.generate_content, prompt, stream=stream)
+    try:
+        return future.result(timeout=GEMINI_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"Gemini did not respond within {GEMINI_TIMEOUT}s")
+
+def generate_content(prompt, purpose, stream=False):
+    """One timed Gemini request (up to the first chunk when streaming)"""
+    with timed('gemini', upstream='gemini', purpose=purpose):
+        return call_gemini(prompt, stream)
+
+async def generate_content_async(prompt, purpose, stream=False):
+    with timed('gemini', upstream='gemini', purpose=purpose):
+        return await asyncio.wait_for(model.generate_content_async(prompt, stream=stream), GEMINI_TIMEOUT)
+
+def generate_itinerary_text(prompt):
+    """Return the itinerary for a prompt, calling Gemini only when it isn't cached"""
+    key = make_key(prompt)
+    itinerary = itinerary_cache.get(key)
+    if itinerary is None:
+        response = upstream('gemini').call(lambda: generate_content(prompt, 'itinerary'))
+        itinerary = response.text.strip()
+        itinerary_cache.set(key, itinerary)
+    return itinerary
+
+def stream_itinerary(prompt):
+    """Yield the itinerary text in chunks as Gemini produces them (all at once when cached)"""
+    key = make_key(prompt)
+    itinerary = itinerary_cache.get(key)
+    if itinerary is not None:
+        yield itinerary
+        return
+    
+    chunks = []
+    labels = {'stage': 'gemini', 'purpose': 'itinerary_stream'}
+    # A stream can't be retried once text has been sent, so only the breaker applies here
+    breaker = upstream('gemini').breaker
+    start = time.perf_counter()
+    probe = False
+    try:
+        probe = breaker.before_call()
+        metrics.upstream_calls.inc(service='gemini', **labels)
+        response = call_gemini(prompt, stream=True)
+        for chunk in response:
+            text = chunk.text
+            if not chunks:
+                text = text.lstrip()
+                metrics.stage_duration.observe(time.perf_counter() - start, stage='gemini_first_chunk')
+            if text:
+                chunks.append(text)
+                yield text
+        metrics.stage_duration.observe(time.perf_counter() - start, **labels)
+        breaker.record_success()
+        # Only complete itineraries are cached
+        itinerary_cache.set(key, "".join(chunks).strip())
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        yield ("\n\n" if chunks else "") + ITINERARY_ERROR_MESSAGE
+    except Exception as e:
+        breaker.record_failure()
+        metrics.upstream_errors.inc(service='gemini', **labels)
+        logger.error(f"Error generating itinerary: {str(e)}")
+        yield ("\n\n" if chunks else "") + ITINERARY_ERROR_MESSAGE
+    except BaseException:
+        # The client closed the stream (GeneratorExit) before the answer finished
+        if probe:
+            breaker.abandon_probe()
+        raise
+
+def itinerary_stream_response(prompt):
+    # Chunked plain text; proxy buffering is disabled so chunks reach the browser immediately
+    return Response(stream_with_context(stream_itinerary(prompt)), mimetype='text/plain',
+                    headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/generate_itinerary', methods=['GET'])
+def generate_itinerary_get():
+    prompt, city, vacation_type, travel_date = itinerary_request_from_args(request.args)
+    
+    # Render the page straight away and let it stream the itinerary in (unless stream=0)
+    if request.args.get('stream', '1') != '0':
+        return render_template('itinerary.html', 
+                              itinerary="",
+                              stream_url=url_for('generate_itinerary_stream', **request.args),
+                              city=city,
+                              vacation_type=vacation_type,
+                              travel_date=travel_date)
     
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text = generate_itinerary_text(prompt)
         
         return render_template('itinerary.html', 
                               itinerary=response_text,
@@ -588,13 +1483,18 @@ def generate_itinerary_get():
                               vacation_type=vacation_type,
                               travel_date=travel_date)
     except Exception as e:
-        print(f"Error generating itinerary: {str(e)}")
+        logger.error(f"Error generating itinerary: {str(e)}")
         return render_template('itinerary.html', 
-                              itinerary="Sorry, there was an error generating your itinerary. Please try again.",
+                              itinerary=ITINERARY_ERROR_MESSAGE,
                               city=city,
                               vacation_type=vacation_type,
                               travel_date=travel_date)
 
+@app.route('/generate_itinerary_stream', methods=['GET'])
+def generate_itinerary_stream():
+    prompt, _, _, _ = itinerary_request_from_args(request.args)
+    return itinerary_stream_response(prompt)
+
 @app.route('/generate_itinerary', methods=['POST'])
 def generate_itinerary():
     data = request.json
@@ -610,14 +1510,81 @@ def generate_itinerary():
         "selected_flight": selected_flight
     })
     
+    # Stream plain text chunks instead of waiting for the whole itinerary
+    if data.get('stream'):
+        return itinerary_stream_response(prompt)
+    
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text = generate_itinerary_text(prompt)
         
         return jsonify({"itinerary": response_text})
     except Exception as e:
-        print(f"Error generating itinerary: {str(e)}")
-        return jsonify({"itinerary": "Sorry, there was an error generating your itinerary. Please try again."})
+        logger.error(f"Error generating itinerary: {str(e)}")
+        return jsonify({"itinerary": ITINERARY_ERROR_MESSAGE})
+
+def all_cache_stats():
+    # Hit/miss counters and sizes for the app's caches
+    stats = {
+        "search_results": search_cache.stats(),
+        "hotel_lists": hotel_cache.stats(),
+        "itineraries": itinerary_cache.stats(),
+        "destination_suggestions": destination_cache.stats()
+    }
+    if serp_cache is not None:
+        stats["serpapi"] = serp_cache.stats()
+    return stats
+
+@metrics.register_collector
+def cache_metrics():
+    # Cache counters as gauges, e.g. cache_hits{cache="serpapi",tier="disk"}
+    series = {}
+    def add(name, stats, tier=None):
+        for stat, value in stats.items():
+            if isinstance(value, dict):
+                add(name, value, stat)
+            else:
+                labels = f'cache="{name}"' + (f',tier="{tier}"' if tier else '')
+                series.setdefault(f"cache_{stat}", []).append(f"cache_{stat}{{{labels}}} {value}")
+    for name, stats in all_cache_stats().items():
+        add(name, stats)
+    lines = []
+    for metric, samples in series.items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(samples)
+    return lines
+
+@app.before_request
+def start_request():
+    # Reuse the caller's request ID so logs can be joined across services
+    g.trace_id = set_trace_id(request.headers.get('X-Request-ID'))
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def finish_request(response):
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        start, method, status = g.request_start, request.method, response.status_code
+        
+        def observe():
+            metrics.http_request_duration.observe(time.perf_counter() - start, route=route,
+                                                  method=method, status=status)
+        
+        # A streamed body is still being generated here; time it once the server has sent all of it
+        if response.is_streamed:
+            response.call_on_close(observe)
+        else:
+            observe()
+        response.headers['X-Trace-Id'] = g.trace_id
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus text exposition
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(all_cache_stats())
 
 @app.route('/get_date_grid', methods=['POST'])
 def get_date_grid():
@@ -635,5 +1602,8 @@ def get_date_grid():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Precompute popular searches during off-peak hours (WARMUP_ENABLED=1)
+start_warmup_thread(warm_search)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""ASGI entrypoint, e.g. ``uvicorn asgi:asgi_app --workers 2``.
+
+/get_all_flights and /get_all_flights_stream are served natively on the server's event loop:
+a search's deals scrape, Gemini stream and SerpApi requests are coroutines sharing one pooled
+HTTP client per worker, so searches in flight hold no threads. Every other route is the Flask
+app, run in the server's thread pool through WsgiToAsgi. With ASYNC_UPSTREAM=0 or without
+httpx, the search routes go through Flask as well.
+"""
+import asyncio
+import json
+import logging
+import time
+from asgiref.wsgi import WsgiToAsgi
+import metrics
+from metrics import set_trace_id
+from warmup import log_search
+from app import (app, ASYNC_UPSTREAM, httpx, parse_search_params, get_search_id, make_async_client,
+                 async_get_all_flights, async_search_stream)
+
+logger = logging.getLogger(__name__)
+
+wsgi_app = WsgiToAsgi(app)
+
+# Shared by every search in this worker; opened on first use, closed at shutdown
+client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        client = make_async_client()
+    return client
+
+
+async def read_json(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionError("Client disconnected before sending the request body")
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    data = json.loads(b''.join(body))
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+async def send_start(send, status, content_type, trace_id, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', content_type.encode()), (b'x-trace-id', trace_id.encode()), *headers
+    ]})
+
+
+async def send_json(send, status, body, trace_id):
+    await send_start(send, status, 'application/json', trace_id)
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def send_lines(send, receive, lines, trace_id):
+    """Send each line of an async iterator as soon as it is produced. If the client disconnects
+    first, the iterator is cancelled so its search stops (and waiting requests take it over)."""
+    # Disable proxy buffering so each line reaches the browser as soon as it is written
+    await send_start(send, 200, 'application/x-ndjson', trace_id, [(b'x-accel-buffering', b'no')])
+
+    async def pump():
+        async for line in lines:
+            await send({'type': 'http.response.body', 'body': line.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    sending = asyncio.ensure_future(pump())
+    watching = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait({sending, watching}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watching.cancel()
+        if not sending.done():
+            logger.info("Client disconnected, cancelling the search stream")
+            sending.cancel()
+        await asyncio.gather(sending, watching, return_exceptions=True)
+
+
+async def search_params(receive, send, trace_id):
+    """Search params from the request body, or None once a 400 has been sent"""
+    try:
+        data = await read_json(receive)
+    except ValueError:
+        await send_json(send, 400, {"error": "Request body must be a JSON object"}, trace_id)
+        return None
+    try:
+        return parse_search_params(data)
+    except ValueError as e:
+        await send_json(send, 400, {"error": str(e)}, trace_id)
+        return None
+
+
+async def get_all_flights(receive, send, trace_id):
+    params = await search_params(receive, send, trace_id)
+    if params is None:
+        return 400
+    search_id = get_search_id(params)
+    log_search(params)
+    try:
+        body = await async_get_all_flights(params, search_id, get_client())
+    except Exception as e:
+        logger.error(f"Error in get_all_flights: {str(e)}")
+        await send_json(send, 500, {"error": "An error occurred while processing the request"}, trace_id)
+        return 500
+    await send_json(send, 200, body, trace_id)
+    return 200
+
+
+async def get_all_flights_stream(receive, send, trace_id):
+    params = await search_params(receive, send, trace_id)
+    if params is None:
+        return 400
+    search_id = get_search_id(params)
+    log_search(params)
+    await send_lines(send, receive, async_search_stream(params, search_id, get_client()), trace_id)
+    return 200
+
+
+NATIVE_ROUTES = {
+    '/get_all_flights': get_all_flights,
+    '/get_all_flights_stream': get_all_flights_stream
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if client is not None:
+                await client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def asgi_app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    route = scope['path'] if scope['type'] == 'http' and scope['method'] == 'POST' else None
+    if route not in NATIVE_ROUTES or not ASYNC_UPSTREAM or httpx is None:
+        return await wsgi_app(scope, receive, send)
+
+    # Same trace ID handling and request timing as the Flask hooks in app.py
+    headers = dict(scope['headers'])
+    trace_id = set_trace_id(headers.get(b'x-request-id', b'').decode('latin-1'))
+    start = time.perf_counter()
+    status = 500
+    try:
+        status = await NATIVE_ROUTES[route](receive, send, trace_id)
+    except ConnectionError as e:
+        # Nobody is left to send a response to
+        logger.info(str(e))
+        status = 499
+    finally:
+        metrics.http_request_duration.observe(time.perf_counter() - start, route=route, method='POST',
+                                              status=status)
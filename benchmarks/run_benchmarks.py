@@ -0,0 +1,180 @@
+"""Offline benchmarks for the search pipeline's CPU-bound stages.
+
+Every stage runs against recorded fixtures in benchmarks/fixtures, so no Gemini, SerpApi,
+deals site or Chrome access is needed.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json   # exit 1 on a regression
+"""
+from datetime import date
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+sys.path.insert(0, ROOT)
+
+# Stay offline and keep benchmark runs out of the app's logs and caches; the SQLite caches
+# go to a temporary directory removed at exit, and INFO logging would skew the timings
+os.environ.setdefault('SEARCH_LOG_PATH', '')
+os.environ.setdefault('WARMUP_ENABLED', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+CACHE_DIR = tempfile.TemporaryDirectory(prefix='benchmarks-')
+for name in ('DEAL_CACHE_PATH', 'LLM_CACHE_PATH', 'SERP_CACHE_PATH'):
+    os.environ.setdefault(name, os.path.join(CACHE_DIR.name, name.lower().replace('_path', '.sqlite3')))
+
+from app import FlightAPI, HotelAPI, HoustonTravelRAG, format_prompt, make_search_entry
+from bundles import top_bundles
+from date_grid_parser import parse_date_grid
+from fare_dates import FareIndex
+from flight_deals_scraper import _article_info, _parse_article, _parse_category
+from records import to_dicts
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def build_stages():
+    """Stage name -> zero-argument callable, with every fixture loaded up front"""
+    flights_json = json.loads(read_fixture('serpapi_google_flights.json'))
+    hotels_json = json.loads(read_fixture('serpapi_google_hotels.json'))
+    gemini_output = read_fixture('gemini_destinations.txt')
+    category_html = read_fixture('deals_category.html')
+    article_html = read_fixture('deals_article.html')
+    date_grid_html = read_fixture('google_flights_response.html')
+
+    flight_api = FlightAPI()
+    hotel_api = HotelAPI()
+    rag = HoustonTravelRAG()
+    hotel_params = hotel_api._search_params('2026-11-15', 'Miami', 3.0, 500, 7)
+
+    flights = flight_api._parse_results(flights_json, '2026-11-15')
+    hotels = hotel_api._parse_results(hotels_json, hotel_params, 'Miami', 500, 7)
+    destinations = [
+        {'city': f"City {i}", 'airport_code': f"C{i:02d}", 'activities': '', 'flights': flights, 'hotels': hotels}
+        for i in range(20)
+    ]
+    flight_dicts = to_dicts(flights)
+    fare_info, posted_date, intervals = _article_info(_parse_article(article_html))
+    deals = [dict(deal, fare_availability=fare_info, posted_date=posted_date, fare_intervals=intervals)
+             for deal in _parse_category(category_html)]
+
+    def search_entry():
+        return make_search_entry({'budget': 2000}, destinations)
+
+    entry = search_entry()
+
+    return {
+        'deal_category_parse': lambda: _parse_category(category_html),
+        'deal_article_parse': lambda: _parse_article(article_html),
+        'extract_flight_details': lambda: flight_api._parse_results(flights_json, '2026-11-15'),
+        'extract_hotel_details': lambda: hotel_api._parse_results(hotels_json, hotel_params, 'Miami', 500, 7),
+        'deal_date_filter': lambda: FareIndex(deals).deals_on(date(2026, 11, 4)),
+        'parse_destinations': lambda: rag._parse_destinations(gemini_output),
+        'format_prompt': lambda: format_prompt({'flights': flight_dicts}, {'type': 'beach', 'date': '2026-11-15'}),
+        'records_to_dicts': lambda: [to_dicts(dest['flights']) + to_dicts(dest['hotels']) for dest in destinations],
+        'build_price_index': search_entry,
+        'top_bundles': lambda: top_bundles(entry['indexes'], 2000, k=50),
+        'date_grid_extract': lambda: parse_date_grid(date_grid_html),
+    }
+
+
+def time_stage(stage, repeat, warmup=1):
+    """Run ``stage`` ``warmup`` + ``repeat`` times and summarize the timed runs in milliseconds"""
+    samples = []
+    for _ in range(warmup):
+        stage()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'min_ms': round(samples[0], 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'max_ms': round(samples[-1], 4)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat, only=None):
+    stages = build_stages()
+    results = {}
+    for name, stage in stages.items():
+        if only and name not in only:
+            continue
+        results[name] = time_stage(stage, repeat)
+        print(f"{name:<24} median {results[name]['median_ms']:>10.3f} ms   p95 {results[name]['p95_ms']:>10.3f} ms",
+              file=sys.stderr)
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'stages': results
+    }
+
+
+def compare(report, baseline, threshold):
+    """Stages whose median got more than ``threshold`` times slower than the baseline"""
+    regressions = []
+    for name, result in report['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if before and before['median_ms'] > 0:
+            ratio = result['median_ms'] / before['median_ms']
+            if ratio > threshold:
+                regressions.append((name, before['median_ms'], result['median_ms'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage against recorded fixtures")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed runs per stage")
+    parser.add_argument('--stage', action='append', help="Only run this stage (repeatable)")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--compare', help="Baseline JSON report to check for regressions")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Median slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    report = run(args.repeat, args.stage)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (commit {baseline.get('commit')})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import heapq
+import os
+
+# Number of bundles /get_bundles returns by default, and the most it will return
+BUNDLE_TOP_K = int(os.getenv('BUNDLE_TOP_K', 10))
+MAX_BUNDLE_TOP_K = int(os.getenv('MAX_BUNDLE_TOP_K', 100))
+
+
+def top_bundles(indexes, budget, k=BUNDLE_TOP_K, max_per_destination=None):
+    """Cheapest flight + hotel bundles within ``budget`` across destinations.
+
+    ``indexes`` maps city -> {'flights': PriceIndex, 'hotels': PriceIndex}. Each
+    destination's flights (by price) and hotels (by total stay price) are walked in sorted
+    order with one shared heap, so the k cheapest pairs are found by expanding only the
+    neighbours of pairs already taken instead of pricing every flight against every hotel.
+    Returns up to ``k`` (total_price, city, flight, hotel) tuples, cheapest first.
+    """
+    heap = []
+    sorted_lists = {}
+    for city, index in indexes.items():
+        flights, hotels = index.get('flights'), index.get('hotels')
+        if not flights or not hotels:
+            continue
+        flight_order = flights.order('price')
+        hotel_order = hotels.order('total_price')
+        flight_prices = flights.columns['price']
+        hotel_prices = hotels.columns['total_price']
+        sorted_lists[city] = (
+            [flight_prices[i] for i in flight_order], [flights.records[i] for i in flight_order],
+            [hotel_prices[i] for i in hotel_order], [hotels.records[i] for i in hotel_order]
+        )
+        heapq.heappush(heap, (flight_prices[flight_order[0]] + hotel_prices[hotel_order[0]], city, 0, 0))
+
+    seen = {(city, 0, 0) for _, city, _, _ in heap}
+    taken = {}
+    bundles = []
+    while heap and len(bundles) < k:
+        total, city, i, j = heapq.heappop(heap)
+        # Every pair left in the heap costs at least this much, so nothing else fits either
+        if total > budget:
+            break
+        flight_prices, flights, hotel_prices, hotels = sorted_lists[city]
+        if max_per_destination is not None and taken.get(city, 0) >= max_per_destination:
+            # This destination is full; stop expanding it
+            continue
+        bundles.append((total, city, flights[i], hotels[j]))
+        taken[city] = taken.get(city, 0) + 1
+        for next_i, next_j in ((i + 1, j), (i, j + 1)):
+            if next_i < len(flights) and next_j < len(hotels) and (city, next_i, next_j) not in seen:
+                seen.add((city, next_i, next_j))
+                heapq.heappush(heap, (flight_prices[next_i] + hotel_prices[next_j], city, next_i, next_j))
+    return bundles
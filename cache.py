@@ -0,0 +1,321 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts):
+    """Build a stable cache key by hashing the JSON form of ``parts``"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def estimate_size(value):
+    """Rough size of a cached value in bytes, based on its JSON encoding"""
+    return len(json.dumps(value, default=str))
+
+
+class Abandoned(Exception):
+    """Outcome of an in-flight computation whose leader stopped without a result (e.g. its
+    request was cancelled); waiting callers retry instead of failing"""
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-entry expiry.
+
+    Entries are evicted least-recently-used first once either ``max_entries`` or
+    ``max_bytes`` (measured with ``sizeof``) is exceeded, and are treated as missing
+    once they are older than their TTL.
+    """
+
+    def __init__(self, max_entries=128, ttl=None, max_bytes=None, sizeof=estimate_size):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()  # key -> (value, expires_at, size)
+        self.total_bytes = 0
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at is None or expires_at > time.time():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        size = self.sizeof(value) if self.max_bytes else 0
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, expires_at, size)
+            self.total_bytes += size
+            self._evict()
+
+    def resize(self, key):
+        """Re-measure ``key``'s value after it was changed in place, keeping its expiry, and
+        evict entries if that puts the cache over ``max_bytes``"""
+        if not self.max_bytes:
+            return
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return
+        size = self.sizeof(entry[0])
+        with self.lock:
+            # Skip it if the entry was replaced or evicted while it was measured
+            if self.entries.get(key) is not entry:
+                return
+            self.entries[key] = (entry[0], entry[1], size)
+            self.total_bytes += size - entry[2]
+            self._evict()
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def _evict(self):
+        while self.entries and (
+            len(self.entries) > self.max_entries or
+            (self.max_bytes and self.total_bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self.entries)))
+
+    def get_or_compute(self, key, compute, ttl=None, cacheable=None):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss.
+
+        Concurrent misses for the same key are coalesced: only the first caller runs
+        ``compute`` and the others wait for its result (or exception). If the leader is
+        interrupted without a result, a waiting caller takes over. A value for which
+        ``cacheable(value)`` is false is handed to the waiting callers but not stored.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            future, leader = self.claim(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except Abandoned:
+                continue
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self.release(key, error=e if isinstance(e, Exception) else Abandoned(f"Computation of {key} abandoned"))
+            raise
+        self.release(key, value, ttl, store=cacheable is None or cacheable(value))
+        return value
+
+    def claim(self, key):
+        """Register an in-flight computation of ``key``. Returns (future, leader): only the
+        leader computes the value and must call ``release``; everyone else waits on the future."""
+        with self.lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+        return future, leader
+
+    def release(self, key, value=None, ttl=None, error=None, store=True):
+        """Finish the leader's computation of ``key``: cache ``value`` (unless ``error``, or
+        ``store`` is false) and hand the outcome to the waiting callers"""
+        future = self.inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            if store:
+                self.set(key, value, ttl)
+            future.set_result(value)
+        # Only now, so a caller arriving meanwhile finds the value or the resolved future
+        # instead of starting another computation
+        with self.lock:
+            self.inflight.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class SQLiteCache:
+    """Persistent cache in a SQLite file, shareable by every worker on the host.
+
+    Values are stored as JSON. Expired rows are ignored on read, and the least
+    recently used rows are pruned once there are more than ``max_entries``.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=None, table='cache'):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self.lock, self._connect() as conn:
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, default=str), expires_at, now)
+            )
+            count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+                conn.execute(f"""
+                    DELETE FROM {self.table} WHERE key IN (
+                        SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT MAX(
+                            (SELECT COUNT(*) FROM {self.table}) - ?, 0)
+                    )
+                """, (self.max_entries,))
+
+    def delete(self, key):
+        with self.lock, self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def stats(self):
+        with self.lock, self._connect() as conn:
+            entries = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {'entries': entries, 'hits': self.hits, 'misses': self.misses}
+
+
+class RedisCache:
+    """Cache backed by any Redis-protocol server, shared across hosts.
+
+    Requires the optional ``redis`` package. Expiry is delegated to the server.
+    """
+
+    def __init__(self, url, ttl=None, prefix='cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("RedisCache requires the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        raw = json.dumps(value, default=str)
+        if ttl:
+            self.client.set(self.prefix + key, raw, ex=max(int(ttl), 1))
+        else:
+            self.client.set(self.prefix + key, raw)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class TieredCache:
+    """In-process cache in front of an optional persistent one.
+
+    Reads check memory first and promote disk hits into memory; writes go to both.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except Exception as e:
+                logger.warning(f"Persistent cache read failed: {str(e)}")
+            if value is not None:
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl)
+            except Exception as e:
+                logger.warning(f"Persistent cache write failed: {str(e)}")
+
+    def stats(self):
+        stats = {'hits': self.hits, 'misses': self.misses, 'memory': self.memory.stats()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
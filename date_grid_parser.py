@@ -0,0 +1,136 @@
+from lxml import html as lxml_html
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+MONTHS = ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"]
+
+# Same cells the in-browser extractor scans: div[aria-label*="$"], div[title*="$"], div[data-price]
+PRICE_CELL_XPATH = '//div[contains(@aria-label, "$") or contains(@title, "$") or @data-price]'
+
+PRICE_PATTERN = re.compile(r'\$\s?\d+(?:,\d{3})*(?:\.\d+)?')
+
+
+def price_type_from_label(label):
+    """Extract special labels like "cheapest price" or "low price" from an aria-label"""
+    lower = label.lower()
+    if "cheapest price" in lower:
+        return "Cheapest Price"
+    if "low price" in lower:
+        return "Low Price"
+    return None
+
+
+def date_range_from_label(label):
+    """Extract a date range such as 'Jun 14 to Jun 17' from an aria-label"""
+    for part in label.split(','):
+        if "to" in part and any(month in part for month in MONTHS):
+            return part.strip()
+    return None
+
+
+def normalize_price_records(records):
+    """Clean up raw {date_range, price, price_type} records, dropping any without a dollar amount"""
+    price_data = []
+    for record in records or []:
+        # Clean up the price string to just show the amount
+        match = PRICE_PATTERN.search(record.get('price') or '')
+        if not match:
+            continue
+        price_data.append({
+            'date_range': record.get('date_range') or "Unknown Date",
+            'price': match.group(0).replace(' ', ''),
+            'price_type': record.get('price_type')
+        })
+    return price_data
+
+
+def price_value(price):
+    """Numeric value of a price string such as '$1,276'"""
+    return float(price.replace('$', '').replace(',', ''))
+
+
+def add_prices(date_grid_data, price_data):
+    """Add price records with a known date range to the return data structure"""
+    for item in price_data:
+        if item['date_range'] != "Unknown Date":
+            date_grid_data['prices'][item['date_range']] = {
+                'price': item['price'],
+                'price_type': item['price_type']
+            }
+
+
+def extract_price_records(page_source):
+    """Scan a Google Flights page source once and return raw {date_range, price, price_type} records"""
+    tree = lxml_html.fromstring(page_source)
+    records = []
+    for element in tree.xpath(PRICE_CELL_XPATH):
+        label = element.get('aria-label') or ''
+        title = element.get('title') or ''
+        text = element.text_content().strip()
+        price = next((value for value in (text, label, title) if '$' in value), None)
+        if not price:
+            continue
+        records.append({
+            'date_range': date_range_from_label(label),
+            'price': price,
+            'price_type': price_type_from_label(label)
+        })
+    return records
+
+
+def parse_date_grid(page_source, source=None, destination=None, start_date=None, end_date=None):
+    """Build the same structure scrape_google_flights returns from a saved or live page source"""
+    date_grid_data = {
+        'source': source,
+        'destination': destination,
+        'search_dates': {
+            'start': start_date,
+            'end': end_date
+        },
+        'prices': {}
+    }
+    add_prices(date_grid_data, normalize_price_records(extract_price_records(page_source)))
+    return date_grid_data
+
+
+def parse_files(paths):
+    """Parse every .html file in ``paths`` (files or directories) and return {path: date_grid_data}"""
+    results = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.html'))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, encoding='utf-8') as f:
+                results[file_path] = parse_date_grid(f.read())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract date grid prices from saved Google Flights pages")
+    parser.add_argument('paths', nargs='*', default=['google_flights_response.html'],
+                        help="HTML files or directories of captured pages")
+    parser.add_argument('--output', help="Write the results as JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = parse_files(args.paths)
+    elapsed = time.perf_counter() - start
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+    total_prices = sum(len(data['prices']) for data in results.values())
+    print(f"Parsed {len(results)} pages ({total_prices} prices) in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
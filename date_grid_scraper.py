@@ -1,6 +1,4 @@
-from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -9,8 +7,15 @@ from selenium.common.exceptions import TimeoutException, ElementNotInteractableE
 import time
 from datetime import datetime, timedelta
 import sys
+import logging
 import os
 import random
+import re
+from driver_pool import driver_pool
+from metrics import timed
+from date_grid_parser import normalize_price_records, extract_price_records, price_value, add_prices
+
+logger = logging.getLogger(__name__)
 
 def create_flight_search_url(source, destination, start_date, end_date):
     base_url = "https://www.google.com/travel/flights"
@@ -28,31 +33,168 @@ def wait_for_element(driver, selector, timeout=30):
     except TimeoutException:
         return None
 
+# Upper bounds (seconds) for each readiness wait; they resolve as soon as the page is ready
+PAGE_LOAD_TIMEOUT = 12
+DATE_GRID_TIMEOUT = 7
+PRICE_RETRY_TIMEOUT = 3
+RETRY_BACKOFF_TIMEOUT = 5
+DOM_QUIET_MS = 500
+
+# Directory to save each scraped page in, for debugging and offline parsing with
+# date_grid_parser (empty to not save pages)
+DATE_GRID_DEBUG_DIR = os.getenv('DATE_GRID_DEBUG_DIR', '')
+
+# Date grid cells carry the price, date range and label in their aria-label
+GRID_PRICE_CELL_SELECTOR = 'div[data-col][aria-label*="$"], div[role="gridcell"] [aria-label*="$"]'
+
+# Records the time of the last DOM mutation so we can tell when the page has settled
+INSTALL_MUTATION_OBSERVER_JS = """
+    if (!window.__lastMutation) {
+        window.__lastMutation = Date.now();
+        new MutationObserver(() => { window.__lastMutation = Date.now(); })
+            .observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+    }
+"""
+
+def wait_until(driver, condition, timeout):
+    """Wait up to ``timeout`` seconds for ``condition(driver)`` to be truthy; returns its value or None"""
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.2).until(condition)
+    except TimeoutException:
+        return None
+
+def wait_for_page_ready(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """Wait for the document to finish loading and start tracking DOM mutations"""
+    ready = wait_until(driver, lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+    driver.execute_script(INSTALL_MUTATION_OBSERVER_JS)
+    return bool(ready)
+
+def wait_for_dom_idle(driver, quiet_ms=DOM_QUIET_MS, timeout=PAGE_LOAD_TIMEOUT):
+    """Wait until no DOM mutation has happened for ``quiet_ms`` milliseconds"""
+    driver.execute_script(INSTALL_MUTATION_OBSERVER_JS)
+    return bool(wait_until(
+        driver,
+        lambda d: d.execute_script("return Date.now() - window.__lastMutation >= arguments[0]", quiet_ms),
+        timeout
+    ))
+
+def wait_for_date_grid_button(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """Wait until a button labelled "Date grid" has been rendered"""
+    return bool(wait_until(driver, lambda d: d.execute_script("""
+        return Array.from(document.querySelectorAll('button'))
+            .some(b => (b.innerText || '').includes('Date grid'));
+    """), timeout))
+
+def wait_for_grid_prices(driver, timeout=DATE_GRID_TIMEOUT):
+    """Wait until date grid cells with prices are present; returns how many were found"""
+    count = wait_until(
+        driver,
+        lambda d: d.execute_script("return document.querySelectorAll(arguments[0]).length", GRID_PRICE_CELL_SELECTOR),
+        timeout
+    )
+    return count or 0
+
 def scroll_page(driver):
-    # Scroll in smaller increments
-    total_height = int(driver.execute_script("return document.body.scrollHeight"))
-    for i in range(0, total_height, 100):
-        driver.execute_script(f"window.scrollTo(0, {i});")
-        random_sleep(0.5, 1)
+    # Scroll a viewport at a time, moving on as soon as lazily loaded content settles
+    position = 0
+    while position < int(driver.execute_script("return document.body.scrollHeight")):
+        driver.execute_script(f"window.scrollTo(0, {position});")
+        wait_for_dom_idle(driver, quiet_ms=200, timeout=1)
+        position += int(driver.execute_script("return window.innerHeight")) or 100
 
-def scrape_google_flights(source, destination, start_date, end_date):
-    # Set up Chrome options
-    chrome_options = Options()
-    # chrome_options.add_argument("--headless=new")  # Removing headless mode for better success rate
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
+# How prices are pulled from the page: 'js' runs the in-browser extractor, 'html' parses
+# driver.page_source in-process; either way the other one is used as a fallback
+DATE_GRID_EXTRACTOR = os.getenv('DATE_GRID_EXTRACTOR', 'js')
+
+# Elements that may hold a date grid price
+PRICE_CELL_SELECTOR = 'div[aria-label*="$"], div[title*="$"], div[data-price]'
+
+# Runs inside the browser: scans the price cells once and returns compact
+# {date_range, price, price_type} records instead of one WebDriver call per attribute
+EXTRACT_PRICES_JS = """
+    const months = ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"];
+    const records = [];
+    for (const el of document.querySelectorAll(arguments[0])) {
+        const label = el.getAttribute('aria-label') || '';
+        const title = el.getAttribute('title') || '';
+        const text = (el.textContent || '').trim();
+        const price = [text, label, title].find(value => value.includes('$'));
+        if (!price) continue;
+
+        // Extract special labels like "cheapest price" or "low price"
+        const lower = label.toLowerCase();
+        let priceType = null;
+        if (lower.includes('cheapest price')) priceType = 'Cheapest Price';
+        else if (lower.includes('low price')) priceType = 'Low Price';
+
+        // Extract date range from aria-label
+        let dateRange = null;
+        for (const part of label.split(',')) {
+            if (part.includes('to') && months.some(month => part.includes(month))) {
+                dateRange = part.trim();
+                break;
+            }
+        }
+        records.push({date_range: dateRange, price: price, price_type: priceType});
+    }
+    return records;
+"""
+
+def extract_prices(driver):
+    """Collect normalized price records from the current page using DATE_GRID_EXTRACTOR"""
+    def from_js():
+        # Scan every grid cell in a single round-trip to the browser
+        return normalize_price_records(driver.execute_script(EXTRACT_PRICES_JS, PRICE_CELL_SELECTOR))
+    
+    def from_html():
+        # Fetch the page source once and parse it without further WebDriver calls
+        return normalize_price_records(extract_price_records(driver.page_source))
+    
+    extractors = [from_html, from_js] if DATE_GRID_EXTRACTOR == 'html' else [from_js, from_html]
+    for extractor in extractors:
+        try:
+            price_data = extractor()
+            if price_data:
+                return price_data
+        except Exception as e:
+            logger.warning(f"Price extraction failed: {str(e)}")
+    return []
+
+def print_price_summary(price_data):
+    # Sort by price and log the prices grouped by date range
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    lines = ["Price Information:", "=" * 50]
+    
+    sorted_prices = sorted(price_data, key=lambda x: price_value(x['price']))
     
-    # Add more realistic user agent and additional options
-    chrome_options.add_argument('--disable-notifications')
-    chrome_options.add_argument('--disable-popup-blocking')
-    chrome_options.add_argument('--disable-infobars')
-    chrome_options.add_argument("--start-maximized")
+    # Group by date range
+    date_groups = {}
+    for item in sorted_prices:
+        date_groups.setdefault(item['date_range'], []).append(item)
     
+    # Display grouped results
+    for date_range, prices in date_groups.items():
+        lines.append(f"Date Range: {date_range}")
+        lines.append("-" * 30)
+        for price_info in prices:
+            price_str = price_info['price']
+            if price_info['price_type']:
+                price_str += f" ({price_info['price_type']})"
+            lines.append(f"Price: {price_str}")
+        lines.append("-" * 30)
+    logger.debug("\n".join(lines))
+
+def save_page_source(driver, source, destination, start_date):
+    # One file per scrape, so concurrent scrapes don't overwrite each other
+    name = re.sub(r'[^A-Za-z0-9-]+', '_', f"{source}_{destination}_{start_date}")
+    output_file = os.path.join(DATE_GRID_DEBUG_DIR, f"{name}_{time.time_ns()}.html")
+    os.makedirs(DATE_GRID_DEBUG_DIR, exist_ok=True)
+    with timed('date_grid_save_page'), open(output_file, 'w', encoding='utf-8') as f:
+        f.write(driver.page_source)
+    logger.debug(f"Response has been saved to {os.path.abspath(output_file)}")
+
+def scrape_google_flights(source, destination, start_date, end_date):
     # Initialize return data structure
     date_grid_data = {
         'source': source,
@@ -64,39 +206,33 @@ def scrape_google_flights(source, destination, start_date, end_date):
         'prices': {}
     }
     
+    driver = None
+    healthy = True
     try:
-        # Initialize the Chrome WebDriver
-        driver = webdriver.Chrome(options=chrome_options)
-        
-        # Set user agent and other properties to make automation harder to detect
-        driver.execute_cdp_cmd('Network.setUserAgentOverride', {
-            "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
-        
-        # Additional settings to avoid detection
-        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-            "source": """
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                })
-            """
-        })
+        # Check out a pre-configured Chrome from the pool (waits if all are busy)
+        with timed('chrome_checkout'):
+            driver = driver_pool.checkout()
         
         # Navigate to Google Flights
         url = create_flight_search_url(source, destination, start_date, end_date)
-        print(f"\nAccessing URL: {url}")
-        driver.get(url)
-        
-        # Initial wait for page load
-        print("Waiting for initial page load...")
-        random_sleep(10, 12)
+        logger.debug(f"Accessing URL: {url}")
+        with timed('date_grid_page_load', upstream='chrome'):
+            driver.get(url)
+            
+            # Initial wait for page load; resolves as soon as the Date grid button is rendered
+            logger.debug("Waiting for initial page load...")
+            wait_for_page_ready(driver)
+            button_ready = wait_for_date_grid_button(driver)
+        if not button_ready:
+            logger.warning("Date grid button did not appear before the page load timeout")
         
-        # Wait for the main content to load
-        print("Waiting for main content to load...")
-        wait = WebDriverWait(driver, 20)
+        # Wait for the main content to load; once the button is rendered, selectors
+        # that don't match shouldn't hold us up for long
+        logger.debug("Waiting for main content to load...")
+        wait = WebDriverWait(driver, 2 if button_ready else 20)
         
         # Wait for and click the "Date grid" button using the specific selectors
-        print("\nLooking for Date grid button...")
+        logger.debug("Looking for Date grid button...")
         date_grid_selectors = [
             'button[jsname="KqtnKd"]',  # Using the specific jsname
             'button.VfPpkd-LgbsSe[jsname="KqtnKd"]',  # Using class and jsname
@@ -110,70 +246,58 @@ def scrape_google_flights(source, destination, start_date, end_date):
         date_grid_button = None
         for selector in date_grid_selectors:
             try:
-                print(f"Trying selector: {selector}")
+                logger.debug(f"Trying selector: {selector}")
                 elements = wait.until(
                     EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
                 )
                 if elements:
-                    print(f"Found {len(elements)} elements with selector: {selector}")
+                    logger.debug(f"Found {len(elements)} elements with selector: {selector}")
                     for element in elements:
                         try:
                             # Check if this is the date grid button by looking for the text
                             if "Date grid" in element.text:
                                 date_grid_button = element
-                                print(f"Found Date grid button with selector: {selector}")
+                                logger.debug(f"Found Date grid button with selector: {selector}")
                                 break
                         except:
                             continue
                 if date_grid_button:
                     break
             except Exception as e:
-                print(f"Selector {selector} failed: {str(e)}")
+                logger.warning(f"Selector {selector} failed: {str(e)}")
                 continue
         
         if date_grid_button:
             # Click the Date grid button
-            print("Clicking Date grid button...")
+            logger.debug("Clicking Date grid button...")
             try:
                 # Wait for the button to be clickable
                 wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
                 # Try regular click first
                 date_grid_button.click()
-                print("Successfully clicked the button")
+                logger.debug("Successfully clicked the button")
             except Exception as e:
-                print(f"Regular click failed: {str(e)}")
+                logger.warning(f"Regular click failed: {str(e)}")
                 try:
                     # Try JavaScript click if regular click fails
                     driver.execute_script("arguments[0].click();", date_grid_button)
-                    print("Successfully clicked the button using JavaScript")
+                    logger.debug("Successfully clicked the button using JavaScript")
                 except Exception as e:
-                    print(f"JavaScript click failed: {str(e)}")
-            
-            # Wait for the date grid to appear
-            print("Waiting for date grid to load...")
-            random_sleep(5, 7)
+                    logger.warning(f"JavaScript click failed: {str(e)}")
             
-            # Try to find price elements specifically
-            print("\nLooking for price elements...")
-            price_selectors = [
-                'div[aria-label*="$"]',  # Elements with price in aria-label
-                'div[jsname] span',  # Spans inside named elements
-                'div[role="button"] span',  # Spans inside buttons
-                'div[role="gridcell"] span',  # Spans inside grid cells
-                'div[role="gridcell"] div',  # Divs inside grid cells
-                'div[jsaction]',  # Elements with actions
-                'div[data-price]',  # Elements with price data
-                'div[class*="price"]',  # Elements with price in class name
-                'div[class*="cost"]'  # Elements with cost in class name
-            ]
+            # Wait for the date grid cells with prices to appear
+            logger.debug("Waiting for date grid to load...")
+            with timed('date_grid_prices_wait'):
+                if wait_for_grid_prices(driver):
+                    wait_for_dom_idle(driver, timeout=DATE_GRID_TIMEOUT)
             
             # Try multiple times to find prices
             max_retries = 3
             retry_count = 0
-            price_elements = []
+            price_data = []
             
-            while retry_count < max_retries and not price_elements:
-                print(f"\nAttempt {retry_count + 1} to find prices...")
+            while retry_count < max_retries and not price_data:
+                logger.debug(f"Attempt {retry_count + 1} to find prices...")
                 
                 # Try to trigger price loading
                 try:
@@ -183,192 +307,44 @@ def scrape_google_flights(source, destination, start_date, end_date):
                         setTimeout(() => window.scrollTo(0, 100), 500);
                         setTimeout(() => window.scrollTo(0, 0), 1000);
                     """)
-                    random_sleep(2, 3)
+                    wait_for_grid_prices(driver, timeout=PRICE_RETRY_TIMEOUT)
                     
-                    # Try each selector
-                    for selector in price_selectors:
-                        try:
-                            print(f"Trying price selector: {selector}")
-                            elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                            if elements:
-                                print(f"Found {len(elements)} potential price elements")
-                                # Check each element for price content
-                                for element in elements:
-                                    try:
-                                        text = element.text.strip()
-                                        aria_label = element.get_attribute('aria-label')
-                                        title = element.get_attribute('title')
-                                        
-                                        # Print all available information
-                                        print(f"\nElement info:")
-                                        print(f"Text: '{text}'")
-                                        print(f"Aria-label: '{aria_label}'")
-                                        print(f"Title: '{title}'")
-                                        
-                                        # Try to get computed styles
-                                        try:
-                                            style = driver.execute_script("""
-                                                let style = window.getComputedStyle(arguments[0]);
-                                                return {
-                                                    display: style.display,
-                                                    visibility: style.visibility,
-                                                    opacity: style.opacity
-                                                };
-                                            """, element)
-                                            print(f"Styles: {style}")
-                                        except:
-                                            pass
-                                        
-                                        # Try to find associated date
-                                        date = None
-                                        if aria_label:
-                                            # Extract special labels like "cheapest price" or "low price"
-                                            if "cheapest price" in aria_label.lower():
-                                                price_type = "Cheapest Price"
-                                            elif "low price" in aria_label.lower():
-                                                price_type = "Low Price"
-                                            
-                                            # Extract date range from aria-label
-                                            parts = aria_label.split(',')
-                                            for part in parts:
-                                                if "to" in part and any(month in part for month in ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"]):
-                                                    date = part.strip()
-                                                    break
-                                        
-                                        # Check for price content
-                                        content = [text, aria_label, title]
-                                        if any('$' in str(c) for c in content if c):
-                                            price_elements.append(element)
-                                            print("Found element with price!")
-                                    except Exception as e:
-                                        print(f"Failed to process element: {str(e)}")
-                                        continue
-                        except Exception as e:
-                            print(f"Selector {selector} failed: {str(e)}")
-                            continue
-                        
-                        if price_elements:
-                            break
+                    with timed('date_grid_extract'):
+                        price_data = extract_prices(driver)
                 except Exception as e:
-                    print(f"Failed to trigger price loading: {str(e)}")
+                    logger.warning(f"Failed to extract prices: {str(e)}")
                 
-                if not price_elements:
+                if not price_data:
                     retry_count += 1
                     if retry_count < max_retries:
-                        print(f"No prices found, waiting before retry...")
-                        random_sleep(3, 5)
+                        logger.debug(f"No prices found, waiting before retry...")
+                        wait_for_grid_prices(driver, timeout=RETRY_BACKOFF_TIMEOUT)
             
-            if price_elements:
-                print(f"\nFound {len(price_elements)} elements with prices")
-                price_data = []
-                
-                for element in price_elements:
-                    try:
-                        # Get the price
-                        price = element.text.strip()
-                        if not price:
-                            price = element.get_attribute('aria-label')
-                        if not price:
-                            price = element.get_attribute('title')
-                        
-                        # Get the date from aria-label
-                        aria_label = element.get_attribute('aria-label')
-                        date = None
-                        price_type = None
-                        
-                        if aria_label:
-                            # Extract special labels like "cheapest price" or "low price"
-                            if "cheapest price" in aria_label.lower():
-                                price_type = "Cheapest Price"
-                            elif "low price" in aria_label.lower():
-                                price_type = "Low Price"
-                            
-                            # Extract date range from aria-label
-                            parts = aria_label.split(',')
-                            for part in parts:
-                                if "to" in part and any(month in part for month in ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"]):
-                                    date = part.strip()
-                                    break
-                        
-                        if price and '$' in price:
-                            # Clean up the price string to just show the amount
-                            price = price.split(',')[0].strip()
-                            
-                            # Add to price data list
-                            price_data.append({
-                                'date_range': date if date else "Unknown Date",
-                                'price': price,
-                                'price_type': price_type
-                            })
-                            
-                            # Add to the return data structure
-                            if date:
-                                date_grid_data['prices'][date] = {
-                                    'price': price,
-                                    'price_type': price_type
-                                }
-                            
-                            # Format the output message
-                            output_msg = f"Found price: {price}"
-                            if price_type:
-                                output_msg += f" ({price_type})"
-                            if date:
-                                output_msg += f" for dates: {date}"
-                            print(output_msg)
-                    except Exception as e:
-                        print(f"Failed to process price element: {str(e)}")
-                        continue
-                
-                # After collecting all data, sort and display it in a more organized way
-                if price_data:
-                    print("\nPrice Information:")
-                    print("=" * 50)
-                    
-                    # Sort by price (removing '$' and converting to float)
-                    sorted_prices = sorted(price_data, key=lambda x: float(x['price'].replace('$', '')))
-                    
-                    # Group by date range
-                    date_groups = {}
-                    for item in sorted_prices:
-                        date_range = item['date_range']
-                        if date_range not in date_groups:
-                            date_groups[date_range] = []
-                        date_groups[date_range].append(item)
-                    
-                    # Display grouped results
-                    for date_range, prices in date_groups.items():
-                        print(f"\nDate Range: {date_range}")
-                        print("-" * 30)
-                        for price_info in prices:
-                            price_str = price_info['price']
-                            if price_info['price_type']:
-                                price_str += f" ({price_info['price_type']})"
-                            print(f"Price: {price_str}")
-                        print("-" * 30)
-                else:
-                    print("\nNo valid price data could be extracted.")
+            if price_data:
+                logger.debug(f"Found {len(price_data)} elements with prices")
+                add_prices(date_grid_data, price_data)
+                print_price_summary(price_data)
             else:
-                print("\nNo price elements found after all attempts.")
+                logger.warning("No price elements found after all attempts.")
         else:
-            print("\nCould not find the Date grid button.")
+            logger.warning("Could not find the Date grid button.")
         
-        # Save the page source for debugging
-        output_file = 'google_flights_response.html'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print(f"\nResponse has been saved to {os.path.abspath(output_file)}")
+        if DATE_GRID_DEBUG_DIR:
+            save_page_source(driver, source, destination, start_date)
         
     except Exception as e:
-        print(f"\nAn error occurred: {str(e)}")
-        print("\nTroubleshooting tips:")
-        print("1. Check your internet connection")
-        print("2. Verify that the dates are valid and in the future")
-        print("3. Try using different city/airport names")
-        print("4. Make sure Chrome is installed on your system")
-        print("5. Try running without headless mode")
+        healthy = False
+        logger.error(f"An error occurred: {str(e)}")
+        logger.info("Troubleshooting tips:\n"
+                    "1. Check your internet connection\n"
+                    "2. Verify that the dates are valid and in the future\n"
+                    "3. Try using different city/airport names\n"
+                    "4. Make sure Chrome is installed on your system\n"
+                    "5. Try running without headless mode")
     finally:
-        if 'driver' in locals():
-            driver.quit()
+        if driver is not None:
+            # Hand the browser back; it is replaced if the scrape broke it
+            driver_pool.checkin(driver, discard=not healthy)
     
     return date_grid_data
 
@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# On-disk cache settings for scraped flight deals
+DEAL_CACHE_PATH = os.getenv('DEAL_CACHE_PATH', 'deal_cache.sqlite3')
+DEAL_CACHE_TTL = float(os.getenv('DEAL_CACHE_TTL', 6 * 60 * 60))  # Seconds before a page is revalidated
+
+
+class DealCache:
+    """SQLite cache of scraped pages keyed by URL.
+
+    Each row keeps the validators (ETag / Last-Modified) needed for a conditional
+    refresh together with the data parsed out of the page, so a page is only parsed
+    again when the site reports that it changed.
+    """
+
+    def __init__(self, path=DEAL_CACHE_PATH, ttl=DEAL_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, url):
+        """Return the cached entry for ``url`` as a dict, or None"""
+        with self.lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, data, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, data, fetched_at = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'data': json.loads(data),
+            'fetched_at': fetched_at,
+            'fresh': time.time() - fetched_at < self.ttl
+        }
+
+    def put(self, url, data, etag=None, last_modified=None):
+        with self.lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, data, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(data), time.time())
+            )
+
+    def touch(self, url):
+        """Mark an entry as fresh again after the server answered 304 Not Modified"""
+        with self.lock, self._connect() as conn:
+            conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Build If-None-Match / If-Modified-Since headers from a cached entry"""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
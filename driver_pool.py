@@ -0,0 +1,194 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from contextlib import contextmanager
+import atexit
+import logging
+import os
+import psutil
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pool settings for the date grid scraper's browsers
+DRIVER_POOL_SIZE = int(os.getenv('DRIVER_POOL_SIZE', 2))
+DRIVER_MAX_USES = int(os.getenv('DRIVER_MAX_USES', 25))
+DRIVER_MAX_MEMORY_MB = float(os.getenv('DRIVER_MAX_MEMORY_MB', 1024))
+DRIVER_CHECKOUT_TIMEOUT = float(os.getenv('DRIVER_CHECKOUT_TIMEOUT', 120))
+DRIVER_HEADLESS = os.getenv('DRIVER_HEADLESS', '1') == '1'
+DRIVER_POOL_PREWARM = os.getenv('DRIVER_POOL_PREWARM', '0') == '1'
+
+
+def create_driver():
+    """Start a Chrome instance with the scraper's options and stealth settings applied"""
+    # Set up Chrome options
+    chrome_options = Options()
+    if DRIVER_HEADLESS:
+        chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    # Add more realistic user agent and additional options
+    chrome_options.add_argument('--disable-notifications')
+    chrome_options.add_argument('--disable-popup-blocking')
+    chrome_options.add_argument('--disable-infobars')
+    chrome_options.add_argument("--start-maximized")
+
+    driver = webdriver.Chrome(options=chrome_options)
+
+    # Set user agent and other properties to make automation harder to detect
+    driver.execute_cdp_cmd('Network.setUserAgentOverride', {
+        "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    })
+
+    # Additional settings to avoid detection
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+        "source": """
+            Object.defineProperty(navigator, 'webdriver', {
+                get: () => undefined
+            })
+        """
+    })
+    return driver
+
+
+def driver_memory_mb(driver):
+    """Resident memory of a driver's browser in MB, summed over its whole process tree"""
+    process = psutil.Process(driver.service.process.pid)
+    processes = [process] + process.children(recursive=True)
+    return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+
+
+class DriverPool:
+    """Bounded pool of pre-configured Chrome drivers.
+
+    At most ``size`` browsers exist at once; callers block in ``checkout`` until one
+    is free. Drivers are health-checked on checkout and replaced after ``max_uses``
+    scrapes or once they use more than ``max_memory_mb``.
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES,
+                 max_memory_mb=DRIVER_MAX_MEMORY_MB, factory=create_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.factory = factory
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.uses = {}
+        self.lock = threading.Lock()
+
+    def warm(self, count=None):
+        """Start up to ``count`` drivers ahead of time so the first requests don't pay for it"""
+        count = min(count or self.size, self.size)
+        started = []
+        for _ in range(count):
+            if not self.slots.acquire(blocking=False):
+                break
+            try:
+                started.append(self._create())
+            except Exception as e:
+                logger.warning(f"Failed to pre-warm driver: {str(e)}")
+                self.slots.release()
+        for driver in started:
+            self.idle.put(driver)
+            self.slots.release()
+
+    def checkout(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        """Take a healthy driver from the pool, waiting up to ``timeout`` seconds for one"""
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No browser available after {timeout}s")
+        try:
+            while True:
+                try:
+                    driver = self.idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+                if self._is_healthy(driver):
+                    return driver
+                self._discard(driver)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def checkin(self, driver, discard=False):
+        """Return a driver to the pool, recycling it if it is broken, worn out or too large"""
+        try:
+            with self.lock:
+                self.uses[driver] = self.uses.get(driver, 0) + 1
+                uses = self.uses[driver]
+            if not discard and uses >= self.max_uses:
+                logger.info(f"Recycling driver after {uses} uses")
+                discard = True
+            if not discard:
+                try:
+                    memory = driver_memory_mb(driver)
+                    if memory > self.max_memory_mb:
+                        logger.info(f"Recycling driver using {memory:.0f} MB")
+                        discard = True
+                    else:
+                        # Leave the page so the idle browser stops running scripts
+                        driver.get('about:blank')
+                except Exception as e:
+                    logger.warning(f"Driver failed during checkin: {str(e)}")
+                    discard = True
+            if discard:
+                self._discard(driver)
+            else:
+                self.idle.put(driver)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def driver(self, timeout=DRIVER_CHECKOUT_TIMEOUT):
+        driver = self.checkout(timeout)
+        discard = False
+        try:
+            yield driver
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.checkin(driver, discard=discard)
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _create(self):
+        driver = self.factory()
+        with self.lock:
+            self.uses[driver] = 0
+        return driver
+
+    def _is_healthy(self, driver):
+        try:
+            driver.window_handles
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        with self.lock:
+            self.uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.close)
+
+if DRIVER_POOL_PREWARM:
+    # Start the browsers in the background so app startup isn't blocked
+    threading.Thread(target=driver_pool.warm, daemon=True).start()
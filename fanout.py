@@ -0,0 +1,301 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the fan-out engine (override with environment variables)
+FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', 16))
+FANOUT_CALL_TIMEOUT = float(os.getenv('FANOUT_CALL_TIMEOUT', 30))
+FANOUT_TOTAL_TIMEOUT = float(os.getenv('FANOUT_TOTAL_TIMEOUT', 60))
+# Coroutines cost no thread, so the async fan-out can keep more calls in flight
+FANOUT_MAX_CONCURRENCY = int(os.getenv('FANOUT_MAX_CONCURRENCY', 64))
+
+
+def iter_fan_out(calls, max_workers=None, call_timeout=None, total_timeout=None, default=None):
+    """Run a dict of key -> zero-argument callable concurrently, yielding (key, result) pairs
+    in completion order.
+
+    At most ``max_workers`` calls run at once. A call that raises, runs longer than
+    ``call_timeout`` seconds, or is still pending when ``total_timeout`` seconds have
+    passed is yielded with ``default`` instead of holding up the other results.
+    """
+    max_workers = max_workers or FANOUT_MAX_WORKERS
+    call_timeout = call_timeout if call_timeout is not None else FANOUT_CALL_TIMEOUT
+    total_timeout = total_timeout if total_timeout is not None else FANOUT_TOTAL_TIMEOUT
+
+    if not calls:
+        return
+
+    started = {}
+
+    def run(key, call):
+        started[key] = time.monotonic()
+        return call()
+
+    deadline = time.monotonic() + total_timeout
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+    try:
+        # Each call runs in a copy of the caller's context so its logs keep the trace ID
+        pending = {executor.submit(contextvars.copy_context().run, run, key, call): key
+                   for key, call in calls.items()}
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                logger.warning(f"Fan-out deadline reached with {len(pending)} calls still pending")
+                break
+
+            # Drop calls that have been running longer than the per-call deadline
+            for future, key in list(pending.items()):
+                if key in started and now - started[key] >= call_timeout:
+                    logger.warning(f"Call {key} exceeded {call_timeout}s, skipping")
+                    del pending[future]
+                    yield key, default
+
+            # Wake up at the next per-call or overall deadline, whichever comes first
+            next_deadline = deadline
+            for key in pending.values():
+                if key in started:
+                    next_deadline = min(next_deadline, started[key] + call_timeout)
+            done, _ = wait(pending, timeout=max(next_deadline - now, 0.01), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                key = pending.pop(future, None)
+                if key is None:
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"Call {key} failed: {str(e)}")
+                    result = default
+                yield key, result
+
+        # Anything still pending missed the overall deadline
+        for key in pending.values():
+            yield key, default
+    finally:
+        # Don't block the request on calls we've given up on
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_fan_out_stream(source, calls_for, max_workers=None, call_timeout=None, total_timeout=None, default=None):
+    """Pipelined ``iter_fan_out`` for work that is discovered gradually.
+
+    ``source`` is an iterator that may block between items (e.g. destinations parsed from a
+    streamed LLM response) and is read on a helper thread; ``calls_for(item)`` returns the
+    item's dict of key -> callable, which start right away instead of after the whole source
+    is read. Yields ('item', item) as each item arrives and ('result', (key, result)) as each
+    call finishes. Limits are as in ``iter_fan_out``; the overall deadline covers reading the
+    source too, so a source that stalls can't hold the caller past it.
+    """
+    max_workers = max_workers or FANOUT_MAX_WORKERS
+    call_timeout = call_timeout if call_timeout is not None else FANOUT_CALL_TIMEOUT
+    total_timeout = total_timeout if total_timeout is not None else FANOUT_TOTAL_TIMEOUT
+
+    events = queue.Queue()
+    started = {}
+
+    def run(key, call):
+        started[key] = time.monotonic()
+        return call()
+
+    deadline = time.monotonic() + total_timeout
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    stopped = threading.Event()
+
+    def feed():
+        try:
+            for item in source:
+                if stopped.is_set():
+                    # The caller gave up; a source blocked in I/O can only be left here
+                    return
+                calls = calls_for(item)
+                # Announce the item before its calls can complete
+                events.put(('item', item, list(calls)))
+                for key, call in calls.items():
+                    future = executor.submit(contextvars.copy_context().run, run, key, call)
+                    future.add_done_callback(lambda future, key=key: events.put(('done', key, future)))
+        except Exception as e:
+            logger.warning(f"Fan-out source failed: {str(e)}")
+        finally:
+            events.put(('end', None, None))
+
+    threading.Thread(target=contextvars.copy_context().run, args=(feed,), daemon=True).start()
+
+    pending = set()
+    source_done = False
+    try:
+        while not source_done or pending:
+            now = time.monotonic()
+            if now >= deadline:
+                logger.warning(f"Fan-out deadline reached with {len(pending)} calls still pending"
+                               + ("" if source_done else " and the source unfinished"))
+                break
+
+            for key in list(pending):
+                if key in started and now - started[key] >= call_timeout:
+                    logger.warning(f"Call {key} exceeded {call_timeout}s, skipping")
+                    pending.discard(key)
+                    yield 'result', (key, default)
+
+            next_deadline = deadline
+            for key in pending:
+                if key in started:
+                    next_deadline = min(next_deadline, started[key] + call_timeout)
+            try:
+                kind, key, value = events.get(timeout=max(next_deadline - now, 0.01))
+            except queue.Empty:
+                continue
+
+            if kind == 'item':
+                pending.update(value)
+                yield 'item', key
+            elif kind == 'done':
+                if key not in pending:
+                    continue
+                pending.discard(key)
+                try:
+                    result = value.result()
+                except Exception as e:
+                    logger.warning(f"Call {key} failed: {str(e)}")
+                    result = default
+                yield 'result', (key, result)
+            else:
+                source_done = True
+
+        for key in pending:
+            yield 'result', (key, default)
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fan_out(calls, max_workers=None, call_timeout=None, total_timeout=None, default=None):
+    """Run a dict of key -> zero-argument callable concurrently and return key -> result.
+
+    Same limits as ``iter_fan_out``; calls that fail or miss a deadline map to ``default``.
+    """
+    results = {key: default for key in calls}
+    for key, result in iter_fan_out(calls, max_workers, call_timeout, total_timeout, default):
+        results[key] = result
+    return results
+
+
+async def async_fan_out(calls, max_concurrency=None, call_timeout=None, total_timeout=None, default=None):
+    """Async counterpart of ``fan_out``: run a dict of key -> zero-argument coroutine function
+    on the current event loop and return key -> result.
+
+    At most ``max_concurrency`` calls are in flight at once; calls that raise or miss the
+    per-call or overall deadline map to ``default``.
+    """
+    max_concurrency = max_concurrency or FANOUT_MAX_CONCURRENCY
+    call_timeout = call_timeout if call_timeout is not None else FANOUT_CALL_TIMEOUT
+    total_timeout = total_timeout if total_timeout is not None else FANOUT_TOTAL_TIMEOUT
+
+    results = {key: default for key in calls}
+    if not calls:
+        return results
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await asyncio.wait_for(call(), call_timeout)
+
+    tasks = {asyncio.ensure_future(run(call)): key for key, call in calls.items()}
+    await _collect(tasks, results, call_timeout, total_timeout)
+    return results
+
+
+async def async_fan_out_stream(source, calls_for, max_concurrency=None, call_timeout=None, total_timeout=None,
+                               default=None):
+    """Async counterpart of ``iter_fan_out_stream``: read ``source`` (an async iterator) and start
+    each item's calls (zero-argument coroutine functions) as soon as it arrives, yielding
+    ('item', item) and ('result', (key, result)) events as they happen. The overall deadline
+    covers reading the source; the source and calls still running when it passes, or when the
+    consumer stops iterating, are cancelled."""
+    max_concurrency = max_concurrency or FANOUT_MAX_CONCURRENCY
+    call_timeout = call_timeout if call_timeout is not None else FANOUT_CALL_TIMEOUT
+    total_timeout = total_timeout if total_timeout is not None else FANOUT_TOTAL_TIMEOUT
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    events = asyncio.Queue()
+    tasks = set()
+
+    async def run(key, call):
+        try:
+            async with semaphore:
+                result = await asyncio.wait_for(call(), call_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Call {key} exceeded {call_timeout}s, skipping")
+            result = default
+        except Exception as e:
+            logger.warning(f"Call {key} failed: {str(e)}")
+            result = default
+        events.put_nowait(('result', key, result))
+
+    async def feed():
+        try:
+            async for item in source:
+                calls = calls_for(item)
+                events.put_nowait(('item', item, list(calls)))
+                for key, call in calls.items():
+                    tasks.add(asyncio.ensure_future(run(key, call)))
+        except Exception as e:
+            logger.warning(f"Fan-out source failed: {str(e)}")
+        finally:
+            events.put_nowait(('end', None, None))
+
+    deadline = loop.time() + total_timeout
+    feeder = asyncio.ensure_future(feed())
+    pending = set()
+    source_done = False
+    try:
+        while not source_done or pending:
+            try:
+                kind, value, extra = await asyncio.wait_for(events.get(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                logger.warning(f"Fan-out deadline reached with {len(pending)} calls still pending"
+                               + ("" if source_done else " and the source unfinished"))
+                break
+
+            if kind == 'item':
+                pending.update(extra)
+                yield 'item', value
+            elif kind == 'result':
+                pending.discard(value)
+                yield 'result', (value, extra)
+            else:
+                source_done = True
+
+        for key in pending:
+            yield 'result', (key, default)
+    finally:
+        # The consumer is done, or went away: nothing else needs these results
+        feeder.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def _collect(tasks, results, call_timeout, total_timeout):
+    # Wait for task -> key futures up to the overall deadline and store what finished in results
+    done, pending = await asyncio.wait(tasks, timeout=total_timeout)
+    if pending:
+        logger.warning(f"Fan-out deadline reached with {len(pending)} calls still pending")
+        for task in pending:
+            task.cancel()
+    for task in done:
+        key = tasks[task]
+        try:
+            results[key] = task.result()
+        except asyncio.TimeoutError:
+            logger.warning(f"Call {key} exceeded {call_timeout}s, skipping")
+        except Exception as e:
+            logger.warning(f"Call {key} failed: {str(e)}")
+    return results
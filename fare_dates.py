@@ -0,0 +1,190 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+import calendar
+import re
+from cache import TTLCache, make_key
+
+MONTHS = {name: number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name: number for number, name in enumerate(calendar.month_abbr) if name})
+MONTHS['Sept'] = 9
+
+# Month names are matched case-sensitively so the verb "may" is not read as a month
+MONTH_PATTERN = '|'.join(sorted(MONTHS, key=len, reverse=True))
+DATE_RE = re.compile(rf'\b(?P<month>{MONTH_PATTERN})\b\.?'
+                     rf'(?:\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\b)?(?:,?\s+(?P<year>\d{{4}})\b)?')
+# "November 2026: 3, 4, 10-12"
+DAY_LIST_RE = re.compile(r'\s*:\s*(?P<days>\d{1,2}(?:\s*(?:,|&|and|-|–|—)\s*\d{1,2})*)')
+# "Nov 3-15, 2026"
+DAY_RANGE_RE = re.compile(r'\s*(?:-|–|—|to|through|thru|until)\s*(?P<day>\d{1,2})(?:st|nd|rd|th)?\b'
+                          r'(?:,?\s+(?P<year>\d{4})\b)?')
+# Loose qualifiers such as "mid-January"; the whole month is kept so no valid day is dropped
+QUALIFIER = r'(?:(?:early|mid|late|end\s+of|beginning\s+of)\s*-?\s*)'
+# Text joining two dates into a range: "November - March", "Jan 12 through Feb 28",
+# "mid-January through mid-March", "late October – early December"
+RANGE_SEPARATOR_RE = re.compile(rf'\s*,?\s*(?:-|–|—|to|through|thru|until)\s*{QUALIFIER}?', re.IGNORECASE)
+# Open-ended start: "valid through May 2027"
+OPEN_START_RE = re.compile(r'(?:through|thru|until|till|before|by)\s*$', re.IGNORECASE)
+
+POSTED_DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%Y-%m-%d")
+
+# Built indexes keyed by the deal set, so repeated searches over the same deals reuse one
+fare_index_cache = TTLCache(max_entries=16)
+
+
+def parse_posted_date(posted_date):
+    for fmt in POSTED_DATE_FORMATS:
+        try:
+            return datetime.strptime((posted_date or '').strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _infer_year(month, reference):
+    # A month without a year is the next one on or after the article's posting month
+    return reference.year if month >= reference.month else reference.year + 1
+
+
+def _month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _bounds(year, month, day):
+    """(first, last) date covered by a month, or by one day of it"""
+    if day is None:
+        return date(year, month, 1), _month_end(year, month)
+    return date(year, month, day), date(year, month, day)
+
+
+def _day_intervals(year, month, days):
+    intervals = []
+    for part in re.split(r'\s*(?:,|&|and)\s*', days):
+        bounds = re.split(r'\s*[-–—]\s*', part)
+        first, last = int(bounds[0]), int(bounds[-1])
+        try:
+            intervals.append((date(year, month, first), date(year, month, last)))
+        except ValueError:
+            continue
+    return intervals
+
+
+def _range(start, end, reference):
+    """Interval between two DATE_RE matches (as (month, day, year) tuples), filling in
+    missing years from each other and from the reference date"""
+    (month1, day1, year1), (month2, day2, year2) = start, end
+    if year1 is None and year2 is None:
+        year1 = _infer_year(month1, reference)
+    if year1 is None:
+        year1 = year2 - 1 if (month1, day1 or 1) > (month2, day2 or 31) else year2
+    if year2 is None:
+        year2 = year1 + 1 if (month2, day2 or 31) < (month1, day1 or 1) else year1
+    return _bounds(year1, month1, day1)[0], _bounds(year2, month2, day2)[1]
+
+
+def _match_parts(match):
+    year = match.group('year')
+    return MONTHS[match.group('month')], int(match.group('day')) if match.group('day') else None, \
+        int(year) if year else None
+
+
+def parse_fare_availability(text, posted_date=None, today=None):
+    """Date intervals, as sorted and merged (start, end) date pairs with both ends inclusive,
+    described by a deal's fare availability text.
+
+    Understands day lists ("November 2026: 3, 4, 10-12"), ranges ("Jan 12 - Feb 28, 2027",
+    "November through March", "Nov 3-15", "mid-January through mid-March"), open-ended ends ("valid through May 2027") and
+    whole months ("December 2026"). Months without a year are placed on or after the month the
+    deal was posted. Returns an empty list when no dates are found.
+    """
+    reference = parse_posted_date(posted_date) or today or date.today()
+    intervals = []
+    for line in (text or '').splitlines():
+        matches = list(DATE_RE.finditer(line))
+        i = 0
+        while i < len(matches):
+            match = matches[i]
+            month, day, year = _match_parts(match)
+            rest = line[match.end():]
+            try:
+                day_list = DAY_LIST_RE.match(rest) if day is None else None
+                day_range = DAY_RANGE_RE.match(rest) if day is not None else None
+                following = matches[i + 1] if i + 1 < len(matches) else None
+                if day_list:
+                    intervals.extend(_day_intervals(year or _infer_year(month, reference), month,
+                                                    day_list.group('days')))
+                elif day_range:
+                    end_year = int(day_range.group('year')) if day_range.group('year') else year
+                    intervals.append(_range((month, day, year), (month, int(day_range.group('day')), end_year),
+                                            reference))
+                elif following and RANGE_SEPARATOR_RE.fullmatch(line[match.end():following.start()]):
+                    intervals.append(_range((month, day, year), _match_parts(following), reference))
+                    i += 1
+                elif OPEN_START_RE.search(line[:match.start()]):
+                    intervals.append(_range((reference.month, reference.day, reference.year),
+                                            (month, day, year), reference))
+                else:
+                    intervals.append(_bounds(year or _infer_year(month, reference), month, day))
+            except ValueError:
+                pass  # Impossible dates such as February 30
+            i += 1
+    return merge_intervals(intervals)
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(interval for interval in intervals if interval[0] <= interval[1]):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def fare_intervals(text, posted_date=None):
+    """``parse_fare_availability`` in the JSON-friendly form kept in the deal cache"""
+    return [[start.isoformat(), end.isoformat()] for start, end in parse_fare_availability(text, posted_date)]
+
+
+class FareIndex:
+    """Deals indexed by the dates their fares are available.
+
+    The distinct interval boundaries of all deals split the calendar into elementary
+    segments, and each segment lists the deals available throughout it, so finding the
+    deals valid on a date is one bisect over the boundaries.
+    """
+
+    def __init__(self, deals):
+        self.deals = list(deals)
+        spans = [
+            (position, date.fromisoformat(start).toordinal(), date.fromisoformat(end).toordinal())
+            for position, deal in enumerate(self.deals) for start, end in deal.get('fare_intervals') or ()
+        ]
+        self.boundaries = sorted({start for _, start, _ in spans} | {end + 1 for _, _, end in spans})
+        segments = [[] for _ in self.boundaries]
+        for position, start, end in spans:
+            for segment in range(bisect_left(self.boundaries, start), bisect_left(self.boundaries, end + 1)):
+                segments[segment].append(position)
+        self.segments = [tuple(positions) for positions in segments]
+        # Deals whose text had no recognizable dates
+        self.undated = [deal for deal in self.deals if not deal.get('fare_intervals')]
+
+    def deals_on(self, day):
+        """Deals with fares available on ``day`` (a date)"""
+        segment = bisect_right(self.boundaries, day.toordinal()) - 1
+        if segment < 0:
+            return []
+        return [self.deals[position] for position in self.segments[segment]]
+
+    def deals_between(self, first, last):
+        """Deals available on at least one day from ``first`` to ``last`` (dates, inclusive)"""
+        low = max(bisect_right(self.boundaries, first.toordinal()) - 1, 0)
+        high = bisect_right(self.boundaries, last.toordinal())
+        positions = sorted({position for segment in self.segments[low:high] for position in segment})
+        return [self.deals[position] for position in positions]
+
+
+def fare_index(deals):
+    """FareIndex for a deal list, reused while the same deals keep coming back"""
+    key = make_key([(deal.get('url'), deal.get('title'), deal.get('fare_availability'), deal.get('fare_intervals'))
+                    for deal in deals])
+    return fare_index_cache.get_or_compute(key, lambda: FareIndex(deals))
@@ -1,114 +1,256 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-import time
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import os
+from rate_limit import HostRateLimiter
+from deal_cache import DealCache
+from fare_dates import fare_intervals
+from resilience import upstream, TRANSIENT_STATUS
 
-def get_fare_availability_and_date(article_url):
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(article_url, headers=headers)
+logger = logging.getLogger(__name__)
+
+# Concurrency and politeness settings for the deals site
+DEALS_MAX_WORKERS = int(os.getenv('DEALS_MAX_WORKERS', 4))
+DEALS_RATE_LIMIT = float(os.getenv('DEALS_RATE_LIMIT', 1))  # Requests per second per host
+DEALS_RATE_BURST = int(os.getenv('DEALS_RATE_BURST', 2))
+DEALS_TIMEOUT = float(os.getenv('DEALS_TIMEOUT', 15))
+
+DEALS_URL = "https://www.theflightdeal.com/category/flight-deals/dallas/"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+def _create_session():
+    # Shared keep-alive session so article fetches reuse pooled connections
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': USER_AGENT
+    })
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DEALS_MAX_WORKERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+session = _create_session()
+rate_limiter = HostRateLimiter(DEALS_RATE_LIMIT, DEALS_RATE_BURST)
+deal_cache = DealCache()
+
+def _fetch(url, headers=None):
+    def fetch():
+        # Wait for the host's rate limit instead of sleeping a fixed amount
+        rate_limiter.acquire(url)
+        response = session.get(url, headers=headers, timeout=DEALS_TIMEOUT)
         response.raise_for_status()
+        return response
+    
+    # Retried and guarded by the deals site's circuit breaker
+    return upstream('deals').call(fetch)
+
+def _stale_or_raise(url, entry, error):
+    # While the site is failing, keep serving the last parsed copy of the page
+    if not entry:
+        raise error
+    logger.warning(f"Serving stale copy of {url}: {str(error)}")
+    return entry['data']
+
+def _fetch_cached(url, parse):
+    """Return parse(html) for a page, reusing the cached result while it is fresh and
+    revalidating with a conditional request once it is stale"""
+    entry = deal_cache.get(url)
+    if entry and entry['fresh']:
+        return entry['data']
+    
+    try:
+        response = _fetch(url, headers=DealCache.conditional_headers(entry))
+    except Exception as e:
+        return _stale_or_raise(url, entry, e)
+    if response.status_code == 304 and entry:
+        # Page hasn't changed, keep the previously parsed data
+        deal_cache.touch(url)
+        return entry['data']
+    
+    data = parse(response.text)
+    deal_cache.put(url, data, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return data
+
+def _parse_article(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Get posted date from header
+    posted_date = ""
+    header = soup.find('header', class_='entry-header')
+    if header:
+        # Try different possible date elements
+        date_element = header.find('time', class_='entry-date published')
+        if not date_element:
+            date_element = header.find('time', class_='entry-date')
+        if not date_element:
+            date_element = header.find('span', class_='date')
+        if not date_element:
+            date_element = header.find('div', class_='posted-on')
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if date_element:
+            posted_date = date_element.get_text(strip=True)
+    
+    # Find the article content
+    article_content = soup.find('div', class_='entry-content')
+    if not article_content:
+        return ["Article content not found", posted_date, []]
         
-        # Get posted date from header
-        posted_date = ""
-        header = soup.find('header', class_='entry-header')
-        if header:
-            # Try different possible date elements
-            date_element = header.find('time', class_='entry-date published')
-            if not date_element:
-                date_element = header.find('time', class_='entry-date')
-            if not date_element:
-                date_element = header.find('span', class_='date')
-            if not date_element:
-                date_element = header.find('div', class_='posted-on')
+    # Find all h2 headings
+    h2_headings = article_content.find_all('h2')
+    
+    # Look for the h2 containing fare availability
+    for h2 in h2_headings:
+        if 'Fare Availability' in h2.text:
+            # Get all content until the next h2
+            content = []
+            current = h2.find_next_sibling()
+            while current and current.name != 'h2':
+                text = current.get_text(strip=True)
+                if text:  # Only add non-empty text
+                    content.append(text)
+                current = current.find_next_sibling()
             
-            if date_element:
-                posted_date = date_element.get_text(strip=True)
-        
-        # Find the article content
-        article_content = soup.find('div', class_='entry-content')
-        if not article_content:
-            return "Article content not found", posted_date
+            fare_info = "\n".join(content)
+            # Parsed once here so the dates are cached with the page
+            return [fare_info, posted_date, fare_intervals(fare_info, posted_date)]
+    
+    return ["Fare Availability information not found", posted_date, []]
+
+def _article_info(data):
+    # Pages cached before fare intervals were stored only have the text and posted date
+    fare_info, posted_date, *intervals = data
+    return fare_info, posted_date, intervals[0] if intervals else fare_intervals(fare_info, posted_date)
+
+def get_fare_availability_and_date(article_url):
+    """Fare availability text, posted date and the availability as [start, end] ISO date pairs"""
+    try:
+        return _article_info(_fetch_cached(article_url, _parse_article))
+    except Exception as e:
+        return f"Error fetching fare availability: {str(e)}", "", []
+
+def _parse_category(html):
+    flight_deals = []
+    
+    # Parse HTML content
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Find all article elements containing flight deals
+    articles = soup.find_all('article')
+    
+    # Extract and clean text from each deal
+    for article in articles:
+        # Get the title
+        title = article.find('h2', class_='entry-title')
+        if title and title.a:
+            deal_title = title.a.text.strip()
+            article_url = title.a['href']  # Get the article URL
             
-        # Find all h2 headings
-        h2_headings = article_content.find_all('h2')
-        
-        # Look for the h2 containing fare availability
-        for h2 in h2_headings:
-            if 'Fare Availability' in h2.text:
-                # Get all content until the next h2
-                content = []
-                current = h2.find_next_sibling()
-                while current and current.name != 'h2':
-                    text = current.get_text(strip=True)
-                    if text:  # Only add non-empty text
-                        content.append(text)
-                    current = current.find_next_sibling()
+            # Get the content
+            content = article.find('div', class_='entry-content')
+            if content:
+                deal_text = content.get_text(separator=' ', strip=True)
                 
-                return "\n".join(content), posted_date
-        
-        return "Fare Availability information not found", posted_date
-        
-    except Exception as e:
-        return f"Error fetching fare availability: {str(e)}", ""
+                # Add deal to list; fare availability is filled in from the article page
+                flight_deals.append({
+                    'title': deal_title,
+                    'content': deal_text[:200] + "...",
+                    'fare_availability': '',
+                    'posted_date': '',
+                    'fare_intervals': [],
+                    'url': article_url
+                })
+    
+    return flight_deals
 
 def get_flight_deals():
-    url = "https://www.theflightdeal.com/category/flight-deals/dallas/"
-    flight_deals = []
+    url = DEALS_URL
     
     try:
-        # Fetch webpage content with headers to mimic a browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Check for HTTP errors
-        
-        # Parse HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # Fetch the category page through the deal cache (shared session, conditional refresh)
+        flight_deals = _fetch_cached(url, _parse_category)
         
-        # Find all article elements containing flight deals
-        articles = soup.find_all('article')
-        
-        # Extract and clean text from each deal
-        for article in articles:
-            # Get the title
-            title = article.find('h2', class_='entry-title')
-            if title and title.a:
-                deal_title = title.a.text.strip()
-                article_url = title.a['href']  # Get the article URL
-                
-                # Get the content
-                content = article.find('div', class_='entry-content')
-                if content:
-                    deal_text = content.get_text(separator=' ', strip=True)
-                    
-                    # Get fare availability and posted date
-                    fare_info, posted_date = get_fare_availability_and_date(article_url)
-                    
-                    # Add deal to list
-                    flight_deals.append({
-                        'title': deal_title,
-                        'content': deal_text[:200] + "...",
-                        'fare_availability': fare_info,
-                        'posted_date': posted_date,
-                        'url': article_url
-                    })
-                    
-                    # Add a small delay to be respectful to the server
-                    time.sleep(2)  # Increased delay to be more respectful
+        # Fetch fare availability and posted date for all articles concurrently;
+        # articles that were already parsed come straight from the cache
+        with ThreadPoolExecutor(max_workers=DEALS_MAX_WORKERS) as executor:
+            article_info = executor.map(get_fare_availability_and_date, [deal['url'] for deal in flight_deals])
+            for deal, (fare_info, posted_date, intervals) in zip(flight_deals, article_info):
+                deal['fare_availability'] = fare_info
+                deal['posted_date'] = posted_date
+                deal['fare_intervals'] = intervals
         
         return flight_deals
             
     except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
+        logger.error(f"Request failed: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
         return []
+
+async def _async_fetch_cached(client, url, parse):
+    """Async counterpart of _fetch_cached using an httpx.AsyncClient"""
+    entry = deal_cache.get(url)
+    if entry and entry['fresh']:
+        return entry['data']
+    
+    headers = {'User-Agent': USER_AGENT, **DealCache.conditional_headers(entry)}
+    
+    async def fetch():
+        # The rate limiter blocks, so wait for it off the event loop
+        await asyncio.to_thread(rate_limiter.acquire, url)
+        response = await client.get(url, headers=headers, timeout=DEALS_TIMEOUT)
+        if response.status_code in TRANSIENT_STATUS:
+            response.raise_for_status()
+        return response
+    
+    try:
+        response = await upstream('deals').acall(fetch)
+        if response.status_code == 304 and entry:
+            deal_cache.touch(url)
+            return entry['data']
+        response.raise_for_status()
+    except Exception as e:
+        return _stale_or_raise(url, entry, e)
+    
+    data = parse(response.text)
+    deal_cache.put(url, data, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return data
+
+async def async_get_fare_availability_and_date(client, article_url):
+    try:
+        return _article_info(await _async_fetch_cached(client, article_url, _parse_article))
+    except Exception as e:
+        return f"Error fetching fare availability: {str(e)}", "", []
+
+async def async_get_flight_deals(client=None):
+    """Async counterpart of get_flight_deals; pass an httpx.AsyncClient to share its connections"""
+    import httpx
+    
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(follow_redirects=True)
+    try:
+        flight_deals = await _async_fetch_cached(client, DEALS_URL, _parse_category)
+        
+        # Article pages are fetched concurrently, still paced by the per-host rate limiter
+        article_info = await asyncio.gather(*[
+            async_get_fare_availability_and_date(client, deal['url']) for deal in flight_deals
+        ])
+        for deal, (fare_info, posted_date, intervals) in zip(flight_deals, article_info):
+            deal['fare_availability'] = fare_info
+            deal['posted_date'] = posted_date
+            deal['fare_intervals'] = intervals
+        
+        return flight_deals
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error(f"An error occurred: {e}")
         return []
+    finally:
+        if own_client:
+            await client.aclose()
 
 if __name__ == "__main__":
     # Print flight deals when run directly
@@ -0,0 +1,69 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayStream:
+    """Incremental parser for a streamed JSON array of objects, such as an LLM response.
+
+    ``feed()`` takes text chunks as they arrive and returns every top-level object whose
+    closing brace was in the chunk, so each one can be used before the array is finished.
+    Text before the opening ``[`` (a ```json fence, a preamble) and after the closing ``]``
+    is ignored, and an object that fails to parse is skipped.
+    """
+
+    def __init__(self):
+        self.started = False  # Seen the opening '['
+        self.finished = False  # Seen the closing ']'
+        self.depth = 0  # Nesting depth inside the current object
+        self.in_string = False
+        self.escaped = False
+        self.current = []  # Text of the object being read
+
+    def feed(self, text):
+        objects = []
+        start = 0 if self.depth else None
+        for i, char in enumerate(text):
+            if self.finished:
+                break
+            if self.depth == 0:
+                # Between objects: only the array brackets and the next object's '{' matter
+                if char == '[' and not self.started:
+                    self.started = True
+                elif char == ']' and self.started:
+                    self.finished = True
+                elif char == '{' and self.started:
+                    self.depth = 1
+                    start = i
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.current.append(text[start:i + 1])
+                    start = None
+                    obj = self._parse(''.join(self.current))
+                    self.current = []
+                    if obj is not None:
+                        objects.append(obj)
+        if self.depth and start is not None:
+            self.current.append(text[start:])
+        return objects
+
+    def _parse(self, raw):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed streamed object: {str(e)}")
+            return None
@@ -0,0 +1,50 @@
+from datetime import datetime
+import os
+import re
+from cache import SQLiteCache, make_key
+
+# Persistent cache for Gemini destination suggestions
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3')
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 24 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 500))
+
+# Words that describe the kind of outing rather than what the user wants from it
+TRIP_STOP_WORDS = {'trip', 'vacation', 'holiday', 'getaway', 'travel', 'a', 'an', 'the', 'for', 'to'}
+
+
+def stem(word):
+    """Light suffix stripping so 'beaches' -> 'beach', 'skiing' -> 'ski', 'cities' -> 'city'"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if len(word) > 5 and word.endswith('ing'):
+        return word[:-3]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize_trip_type(trip_type):
+    """Canonical form of a free-text trip type: 'Beach', 'beach trip' and 'beaches' all become 'beach'"""
+    words = [stem(word) for word in re.findall(r'[a-z]+', (trip_type or '').lower())]
+    words = [word for word in words if word not in TRIP_STOP_WORDS]
+    return ' '.join(sorted(set(words))) or (trip_type or '').strip().lower()
+
+
+def month_bucket(travel_date):
+    """Bucket a YYYY-MM-DD travel date to its month"""
+    try:
+        return datetime.strptime(travel_date, "%Y-%m-%d").strftime("%Y-%m")
+    except (TypeError, ValueError):
+        return (travel_date or '').strip()
+
+
+def destinations_key(trip_type, travel_date, deals):
+    """Cache key for a destination suggestion: normalized trip type, travel month and deal set"""
+    deal_set = sorted((deal.get('title', ''), deal.get('fare_availability', '')) for deal in deals)
+    return make_key('destinations', normalize_trip_type(trip_type), month_bucket(travel_date), make_key(deal_set))
+
+
+destination_cache = SQLiteCache(LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES,
+                                ttl=LLM_CACHE_TTL, table='destination_suggestions')
@@ -0,0 +1,195 @@
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+# Logging settings; LOG_FORMAT=json writes one JSON object per line
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+# Latency samples kept per series for the quantiles
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', 2048))
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Trace ID of the request (or background job) the current code is running for
+trace_id_var = contextvars.ContextVar('trace_id', default='-')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def set_trace_id(trace_id=None):
+    """Set the current trace ID (a new one when ``trace_id`` is empty) and return it"""
+    trace_id = trace_id or new_trace_id()
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+class TraceIdFilter(logging.Filter):
+    """Stamp every log record with the current trace ID"""
+
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'trace_id': getattr(record, 'trace_id', '-'),
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send leveled, trace-stamped logs to stderr; safe to call more than once"""
+    root = logging.getLogger()
+    if any(getattr(handler, 'travel_agent', False) for handler in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.travel_agent = True
+    handler.addFilter(TraceIdFilter())
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s'))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Latency distribution with labels, exported as a Prometheus summary.
+
+    Count and sum cover every observation; the p50/p95/p99 quantiles are computed
+    over the most recent ``window`` samples of each series.
+    """
+
+    def __init__(self, name, help_text, window=METRICS_WINDOW):
+        self.name = name
+        self.help_text = help_text
+        self.window = window
+        self.series = {}  # label key -> [samples deque, count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [deque(maxlen=self.window), 0, 0.0]
+            series[0].append(value)
+            series[1] += 1
+            series[2] += value
+
+    def quantiles(self, **labels):
+        with self.lock:
+            series = self.series.get(_label_key(labels))
+            samples = sorted(series[0]) if series else []
+        return {q: _quantile(samples, q) for q in QUANTILES}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} summary"]
+        with self.lock:
+            snapshot = [(key, sorted(samples), count, total) for key, (samples, count, total) in self.series.items()]
+        for key, samples, count, total in sorted(snapshot):
+            for q in QUANTILES:
+                lines.append(f"{self.name}{_format_labels(key, [('quantile', q)])} {_quantile(samples, q):.6f}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def _quantile(samples, q):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+# Metrics shared by the whole app
+http_request_duration = Histogram('http_request_duration_seconds', 'HTTP request latency by route')
+stage_duration = Histogram('stage_duration_seconds', 'Latency of pipeline stages and upstream calls')
+upstream_calls = Counter('upstream_calls_total', 'Calls made to Gemini, SerpApi, the deals site and Chrome')
+upstream_errors = Counter('upstream_errors_total', 'Upstream calls and stages that raised')
+
+collectors = []  # Callables returning extra exposition lines at scrape time
+
+
+def register_collector(collector):
+    collectors.append(collector)
+    return collector
+
+
+@contextmanager
+def timed(stage, upstream=None, **labels):
+    """Time the enclosed block into stage_duration_seconds{stage=...}; with ``upstream``
+    set it also counts the call, and any exception is counted as an error"""
+    labels = {'stage': stage, **labels}
+    if upstream:
+        upstream_calls.inc(service=upstream, **labels)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        upstream_errors.inc(service=upstream or 'internal', **labels)
+        raise
+    finally:
+        stage_duration.observe(time.perf_counter() - start, **labels)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in (http_request_duration, stage_duration, upstream_calls, upstream_errors):
+        lines.extend(metric.render())
+    for collector in collectors:
+        try:
+            lines.extend(collector())
+        except Exception:
+            logging.getLogger(__name__).exception("Metrics collector failed")
+    return '\n'.join(lines) + '\n'
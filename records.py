@@ -0,0 +1,169 @@
+from array import array
+from dataclasses import dataclass
+import math
+
+
+def format_duration(minutes):
+    """Convert minutes to a formatted duration string (e.g., '2h 30m')"""
+    if not minutes:
+        return "N/A"
+
+    hours = minutes // 60
+    remaining_minutes = minutes % 60
+
+    if hours > 0 and remaining_minutes > 0:
+        return f"{hours}h {remaining_minutes}m"
+    elif hours > 0:
+        return f"{hours}h"
+    else:
+        return f"{remaining_minutes}m"
+
+
+@dataclass(slots=True)
+class Flight:
+    """One flight option, with price and duration kept as numbers"""
+    airline: str
+    flight_no: str
+    departure: str
+    arrival: str
+    price: float
+    aircraft: str
+    duration_minutes: int
+    connection_info: str = ""
+    stops: int = 0
+    date: str = ""
+    mock: bool = False  # Placeholder served while SerpApi is unavailable
+
+    def to_dict(self):
+        return {
+            "airline": self.airline,
+            "flight_no": self.flight_no,
+            "departure": self.departure,
+            "arrival": self.arrival,
+            "price": self.price,
+            "aircraft": self.aircraft,
+            "duration": format_duration(self.duration_minutes),
+            "duration_minutes": self.duration_minutes,
+            "connection_info": self.connection_info,
+            "stops": self.stops,
+            "date": self.date,
+            "mock": self.mock
+        }
+
+
+@dataclass(slots=True)
+class Hotel:
+    """One hotel option; only the first image is kept since that is all the pages show"""
+    name: str
+    price: float
+    rating: float
+    address: str
+    amenities: tuple = ()
+    image: str = ""
+    reviews: int = 0
+    hotel_class: str = "Not rated"
+    location_rating: float = 0
+    check_in: str = ""
+    check_out: str = ""
+    total_price: float = 0
+    mock: bool = False  # Placeholder served while SerpApi is unavailable
+
+    @property
+    def price_per_star(self):
+        """Nightly price per rating point; lower is better value"""
+        return self.price / self.rating if self.rating else math.inf
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "price": self.price,
+            "rating": self.rating,
+            "address": self.address,
+            "amenities": list(self.amenities),
+            "images": [self.image] if self.image else [],
+            "reviews": self.reviews,
+            "hotel_class": self.hotel_class,
+            "location_rating": self.location_rating,
+            "check_in": self.check_in,
+            "check_out": self.check_out,
+            "total_price": self.total_price,
+            "mock": self.mock
+        }
+
+
+class MockRecords(list):
+    """Records served in place of an unavailable upstream; marks the result as mock even
+    when no placeholder fit the search"""
+    mock = True
+
+
+def has_mock(records):
+    """Whether ``records`` were served in place of real results, in whole or in part"""
+    return getattr(records, 'mock', False) or any(getattr(record, 'mock', False) for record in records or ())
+
+
+def to_dicts(records):
+    """JSON-ready form of a list of records (or already-converted dicts)"""
+    if records is None:
+        return None
+    return [record.to_dict() if hasattr(record, 'to_dict') else record for record in records]
+
+
+class PriceIndex:
+    """Columnar index over a list of records.
+
+    Each numeric column is stored once as a packed ``array('d')`` so filters and sorts
+    scan flat arrays instead of record objects. Sorted orders are computed on first use
+    and reused by later queries.
+    """
+
+    def __init__(self, records, columns):
+        self.records = list(records)
+        self.columns = {
+            name: array('d', (float(getattr(record, name) or 0) for record in self.records))
+            for name in columns
+        }
+        self.orders = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def order(self, column, reverse=False):
+        """Positions of the records sorted by ``column`` (stable, so ties keep upstream order)"""
+        key = (column, reverse)
+        if key not in self.orders:
+            values = self.columns[column]
+            positions = sorted(range(len(values)), key=values.__getitem__, reverse=reverse)
+            self.orders[key] = array('l', positions)
+        return self.orders[key]
+
+    def mask(self, column, low=-math.inf, high=math.inf):
+        """Boolean column: True where ``low <= value <= high``"""
+        return [low <= value <= high for value in self.columns[column]]
+
+    def query(self, sort=None, descending=False, masks=(), offset=0, limit=None):
+        """Records passing every mask, in ``sort`` order (upstream order when None), sliced
+        to ``offset``/``limit``. Returns (matching_count, records)."""
+        positions = self.order(sort, descending) if sort else range(len(self.records))
+        masks = list(masks)
+        if masks:
+            keep = [all(mask[i] for mask in masks) for i in range(len(self.records))]
+            positions = [i for i in positions if keep[i]]
+        end = offset + limit if limit is not None else None
+        return len(positions), [self.records[i] for i in positions[offset:end]]
+
+    def min(self, column):
+        values = self.columns[column]
+        return min(values) if values else None
+
+    def max(self, column):
+        values = self.columns[column]
+        return max(values) if values else None
+
+
+def flight_index(flights):
+    return PriceIndex(flights or [], ('price', 'duration_minutes', 'stops'))
+
+
+def hotel_index(hotels):
+    return PriceIndex(hotels or [], ('price', 'total_price', 'rating', 'price_per_star'))
@@ -0,0 +1,284 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', 30))
+
+# Retries of transient errors (timeouts, connection errors, 429/5xx) with full-jitter backoff
+RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', 3))  # Total attempts, including the first
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 0.25))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 2))
+# Services whose attempts are slow enough to need fewer retries; each Gemini attempt can run
+# for GEMINI_TIMEOUT, so the default allows one retry
+SERVICE_RETRY_ATTEMPTS = {'gemini': int(os.getenv('GEMINI_RETRY_ATTEMPTS', 2))}
+
+# Hedged requests: send a duplicate once a call runs longer than the upstream's recent p95.
+# Only idempotent, cheap reads are hedged; comma-separated service names (empty to disable)
+HEDGE_UPSTREAMS = {name for name in os.getenv('HEDGE_UPSTREAMS', 'serpapi').split(',') if name}
+HEDGE_QUANTILE = float(os.getenv('HEDGE_QUANTILE', 0.95))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))  # Latencies needed before hedging starts
+HEDGE_MAX_RATIO = float(os.getenv('HEDGE_MAX_RATIO', 0.1))  # Cap on hedges as a share of calls
+HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', 32))  # Threads for duplicates only
+LATENCY_WINDOW = 256
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# Matched by name so requests, httpx and google.api_core errors are covered without importing them
+TRANSIENT_ERRORS = {
+    'Timeout', 'ConnectTimeout', 'ReadTimeout', 'ConnectionError', 'TransportError', 'TimeoutException',
+    'NetworkError', 'RemoteProtocolError', 'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+    'TooManyRequests', 'ResourceExhausted'
+}
+
+retries = metrics.Counter('upstream_retries_total', 'Retried upstream calls')
+hedges = metrics.Counter('upstream_hedges_total', 'Hedged duplicate upstream requests')
+rejections = metrics.Counter('upstream_breaker_rejections_total', 'Calls failed fast by an open circuit breaker')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+def is_transient(error):
+    """Whether retrying ``error`` could succeed"""
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(error, 'code', None)
+    if status in TRANSIENT_STATUS:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff before retry number ``attempt`` (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: calls pass. Open: calls fail fast until ``reset_timeout`` has passed.
+    Half-open: one probe call is let through; its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now; returns whether the call
+        is the half-open probe"""
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            if not self.probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.probing = True
+                return True
+        rejections.inc(upstream=self.name)
+        raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def abandon_probe(self):
+        """The probe was cancelled or closed before it had an outcome; let the next call probe"""
+        with self.lock:
+            self.probing = False
+
+
+hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+
+
+class Upstream:
+    """Breaker, retries and optional hedging around calls to one upstream endpoint"""
+
+    def __init__(self, name, attempts=RETRY_ATTEMPTS, hedge=None):
+        self.name = name
+        self.attempts = max(1, attempts)
+        self.hedge = hedge if hedge is not None else name.split(':')[0] in HEDGE_UPSTREAMS
+        self.breaker = CircuitBreaker(name)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Seconds to wait before sending a duplicate request, or None to not hedge this call"""
+        if not self.hedge:
+            return None
+        with self.lock:
+            self.calls += 1
+            if len(self.latencies) < HEDGE_MIN_SAMPLES or self.hedged >= HEDGE_MAX_RATIO * self.calls:
+                return None
+            samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(HEDGE_QUANTILE * len(samples)))]
+
+    def _succeeded(self, start):
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        self.breaker.record_success()
+
+    def _take_hedge(self):
+        with self.lock:
+            self.hedged += 1
+        hedges.inc(upstream=self.name)
+
+    def _should_retry(self, error, attempt):
+        self.breaker.record_failure()
+        if attempt + 1 >= self.attempts or not is_transient(error):
+            return False
+        retries.inc(upstream=self.name)
+        logger.info(f"Retrying {self.name} after {type(error).__name__}: {str(error)}")
+        return True
+
+    def call(self, fn):
+        """Return ``fn()``, retrying transient errors; raises CircuitOpenError while the breaker is open"""
+        for attempt in range(self.attempts):
+            probe = self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                result = self._hedged(fn)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.abandon_probe()
+                raise
+            self._succeeded(start)
+            return result
+
+    def _hedged(self, fn):
+        delay = self.hedge_delay()
+        if delay is None:
+            return fn()
+        # The primary runs inline; the duplicate is only sent if it is still running after the
+        # delay. A primary that then fails or times out returns the duplicate's result instead
+        # of going through a retry round.
+        context = contextvars.copy_context()  # So the duplicate keeps the caller's trace ID
+        duplicate = []
+
+        def send_duplicate():
+            self._take_hedge()
+            duplicate.append(hedge_executor.submit(context.run, fn))
+
+        timer = threading.Timer(delay, send_duplicate)
+        timer.daemon = True
+        timer.start()
+        try:
+            return fn()
+        except Exception:
+            timer.cancel()
+            if not duplicate:
+                raise
+            logger.info(f"Primary {self.name} call failed, using the hedged duplicate")
+            return duplicate[0].result()
+        finally:
+            timer.cancel()
+
+    async def acall(self, make_coro):
+        """Async ``call``: ``make_coro()`` must return a fresh awaitable on every call"""
+        for attempt in range(self.attempts):
+            probe = self.breaker.before_call()
+            start = time.monotonic()
+            try:
+                result = await self._ahedged(make_coro)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            except BaseException:
+                # Cancelled, e.g. by a fan-out deadline or a client disconnect
+                if probe:
+                    self.breaker.abandon_probe()
+                raise
+            self._succeeded(start)
+            return result
+
+    async def _ahedged(self, make_coro):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await make_coro()
+        primary = asyncio.ensure_future(make_coro())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        self._take_hedge()
+        pending = {primary, asyncio.ensure_future(make_coro())}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The slower copy is no longer needed
+            for task in pending:
+                task.cancel()
+
+
+upstreams = {}
+upstreams_lock = threading.Lock()
+
+
+def upstream(name):
+    """The shared Upstream for ``name`` (e.g. 'serpapi:google_flights', 'gemini', 'deals')"""
+    with upstreams_lock:
+        if name not in upstreams:
+            upstreams[name] = Upstream(name, SERVICE_RETRY_ATTEMPTS.get(name.split(':')[0], RETRY_ATTEMPTS))
+        return upstreams[name]
+
+
+@metrics.register_collector
+def resilience_metrics():
+    lines = retries.render() + hedges.render() + rejections.render()
+    lines.append("# TYPE upstream_breaker_open gauge")
+    with upstreams_lock:
+        current = list(upstreams.values())
+    for endpoint in current:
+        lines.append(f'upstream_breaker_open{{upstream="{endpoint.name}"}} {int(endpoint.breaker.state != "closed")}')
+    return lines
@@ -0,0 +1,181 @@
+import logging
+import math
+import os
+from serpapi.google_search import GoogleSearch
+from cache import TTLCache, SQLiteCache, RedisCache, make_key
+from metrics import timed
+from resilience import upstream
+
+logger = logging.getLogger(__name__)
+
+# Endpoint GoogleSearch calls, used directly by the async client
+SERPAPI_URL = 'https://serpapi.com/search'
+
+# Shared SerpApi response cache settings
+SERP_CACHE_BACKEND = os.getenv('SERP_CACHE_BACKEND', 'memory')  # memory, sqlite, redis or none
+SERP_CACHE_PATH = os.getenv('SERP_CACHE_PATH', 'serp_cache.sqlite3')
+SERP_CACHE_URL = os.getenv('SERP_CACHE_URL', 'redis://localhost:6379/0')
+SERP_CACHE_MAX_ENTRIES = int(os.getenv('SERP_CACHE_MAX_ENTRIES', 2000))
+SERP_CACHE_MAX_BYTES = int(os.getenv('SERP_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # memory backend only
+
+# Time-to-live in seconds per SerpApi engine; fares move faster than hotel rates
+SERP_CACHE_TTLS = {
+    'google_flights': float(os.getenv('SERP_CACHE_TTL_FLIGHTS', 15 * 60)),
+    'google_hotels': float(os.getenv('SERP_CACHE_TTL_HOTELS', 60 * 60)),
+}
+SERP_CACHE_DEFAULT_TTL = float(os.getenv('SERP_CACHE_DEFAULT_TTL', 15 * 60))
+
+# max_price sent to SerpApi is rounded up to this band so nearby budgets share one cached
+# response; callers filter the results against their exact budget. 0 disables banding.
+SERP_PRICE_BAND = int(os.getenv('SERP_PRICE_BAND', 100))
+
+# Last good response per request, kept past its TTL and served when SerpApi is failing
+SERP_STALE_TTL = float(os.getenv('SERP_STALE_TTL', 24 * 60 * 60))  # 0 disables
+SERP_STALE_MAX_BYTES = int(os.getenv('SERP_STALE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Params that don't change the search results and must not leak into shared keys
+EXCLUDED_PARAMS = ('api_key', 'serp_api_key', 'source', 'output')
+
+
+def create_backend(name=SERP_CACHE_BACKEND):
+    if name == 'memory':
+        return TTLCache(max_entries=SERP_CACHE_MAX_ENTRIES, max_bytes=SERP_CACHE_MAX_BYTES)
+    if name == 'sqlite':
+        return SQLiteCache(SERP_CACHE_PATH, max_entries=SERP_CACHE_MAX_ENTRIES, table='serp_responses')
+    if name == 'redis':
+        return RedisCache(SERP_CACHE_URL, prefix='serp:')
+    if name == 'none':
+        return None
+    raise ValueError(f"Unknown SERP_CACHE_BACKEND: {name}")
+
+
+serp_cache = create_backend()
+stale_cache = TTLCache(max_entries=SERP_CACHE_MAX_ENTRIES, ttl=SERP_STALE_TTL,
+                       max_bytes=SERP_STALE_MAX_BYTES) if SERP_STALE_TTL else None
+
+
+def price_band(max_price):
+    """Round a max_price up to the next SERP_PRICE_BAND step"""
+    if not SERP_PRICE_BAND:
+        return max_price
+    return int(math.ceil(max_price / SERP_PRICE_BAND) * SERP_PRICE_BAND)
+
+
+def params_key(params):
+    """Canonical cache key for a SerpApi request, ignoring the API key"""
+    return make_key({k: str(v) for k, v in params.items() if k not in EXCLUDED_PARAMS})
+
+
+class SerpApiError(Exception):
+    """SerpApi answered with an error status; ``code`` is the HTTP status, so 429 and 5xx
+    count as transient"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+def _checked_results(response):
+    """JSON body of a SerpApi response (requests or httpx), raising SerpApiError on an error
+    status. A 200 with an ``error`` key, such as "no results", is a valid answer."""
+    try:
+        results = response.json()
+    except ValueError:
+        results = {}
+    if response.status_code >= 400:
+        raise SerpApiError(f"SerpApi returned {response.status_code}: {results.get('error', 'no details')}",
+                           response.status_code)
+    return results
+
+
+def _read_cache(key):
+    try:
+        return serp_cache.get(key)
+    except Exception as e:
+        # A broken cache backend should never take the search down with it
+        logger.warning(f"SerpApi cache read failed: {str(e)}")
+        return None
+
+
+def _write_cache(key, params, results):
+    # Error responses are not cached so the next request tries again
+    if 'error' in results:
+        return
+    if stale_cache is not None:
+        stale_cache.set(key, results)
+    if serp_cache is None:
+        return
+    ttl = SERP_CACHE_TTLS.get(params.get('engine'), SERP_CACHE_DEFAULT_TTL)
+    try:
+        serp_cache.set(key, results, ttl)
+    except Exception as e:
+        logger.warning(f"SerpApi cache write failed: {str(e)}")
+
+
+def _stale_or_raise(key, params, error):
+    # Serve the last good response while SerpApi is failing; re-raise when there is none
+    results = stale_cache.get(key) if stale_cache is not None and key else None
+    if results is None:
+        raise error
+    logger.warning(f"Serving stale {params.get('engine')} results after: {str(error)}")
+    return results
+
+
+def _endpoint(params):
+    return upstream(f"serpapi:{params.get('engine')}")
+
+
+def cached_search(params, timeout=None):
+    """Return SerpApi's JSON results for ``params`` (as ``GoogleSearch(params).get_dict()``), served
+    from the shared cache when possible.
+
+    The request goes through the SerpApi circuit breaker and retries; error statuses count as
+    failures (retried when transient). If it still fails, the last good response for the same
+    params is returned when one is kept.
+    """
+    key = params_key(params)
+    if serp_cache is not None:
+        results = _read_cache(key)
+        if results is not None:
+            return results
+
+    def fetch():
+        search = GoogleSearch(dict(params))
+        if timeout:
+            search.timeout = timeout
+        # get_dict() doesn't look at the status, so read the response to catch errors
+        search.params_dict['output'] = 'json'
+        with timed('serpapi', upstream='serpapi', engine=params.get('engine')):
+            return _checked_results(search.get_response())
+
+    try:
+        results = _endpoint(params).call(fetch)
+    except Exception as e:
+        return _stale_or_raise(key, params, e)
+
+    _write_cache(key, params, results)
+    return results
+
+
+async def async_cached_search(params, client, timeout=None):
+    """Same as ``cached_search`` but fetched with an ``httpx.AsyncClient`` so many searches can
+    share one event loop; takes the same params and returns the same dict"""
+    key = params_key(params)
+    if serp_cache is not None:
+        results = _read_cache(key)
+        if results is not None:
+            return results
+
+    async def fetch():
+        with timed('serpapi', upstream='serpapi', engine=params.get('engine')):
+            response = await client.get(SERPAPI_URL, params={**params, 'output': 'json', 'source': 'python'},
+                                        timeout=timeout)
+            return _checked_results(response)
+
+    try:
+        results = await _endpoint(params).acall(fetch)
+    except Exception as e:
+        return _stale_or_raise(key, params, e)
+
+    _write_cache(key, params, results)
+    return results
@@ -0,0 +1,69 @@
+import threading
+from cache import TTLCache
+
+
+def test_caller_arriving_during_release_does_not_recompute():
+    computes, results, late = [], [], []
+
+    def compute():
+        computes.append(1)
+        return 'value'
+
+    def sizeof(value):
+        # Runs inside the leader's release, before the value is stored
+        thread = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+        thread.start()
+        thread.join(0.1)
+        late.append(thread)
+        return 1
+
+    cache = TTLCache(max_bytes=1000, sizeof=sizeof)
+    assert cache.get_or_compute('key', compute) == 'value'
+    for thread in late:
+        thread.join(1)
+    assert len(computes) == 1
+    assert results == ['value']
+    assert not cache.inflight
+
+
+def test_waiting_caller_takes_over_when_the_leader_is_interrupted():
+    cache = TTLCache()
+    started, interrupt = threading.Event(), threading.Event()
+    results = []
+
+    class Interrupted(BaseException):
+        pass
+
+    def interrupted_compute():
+        started.set()
+        interrupt.wait(1)
+        raise Interrupted
+
+    def leader():
+        try:
+            cache.get_or_compute('key', interrupted_compute)
+        except Interrupted:
+            pass
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait(1)
+    follower = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', lambda: 'retried')))
+    follower.start()
+    interrupt.set()
+    leader_thread.join(1)
+    follower.join(1)
+    assert results == ['retried']
+
+
+
+def test_resize_counts_in_place_growth_against_max_bytes():
+    cache = TTLCache(max_bytes=10, sizeof=len, ttl=60)
+    cache.set('old', [1] * 4)
+    cache.set('new', [1] * 4)
+    expires_at = cache.entries['new'][1]
+    cache.get('new').extend([1] * 4)
+    cache.resize('new')
+    assert cache.total_bytes == 8
+    assert 'old' not in cache.entries
+    assert cache.entries['new'][1] == expires_at
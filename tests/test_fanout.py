@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+from fanout import iter_fan_out_stream, async_fan_out_stream
+
+
+def test_stalled_source_is_bounded_by_the_total_deadline():
+    stall = threading.Event()
+
+    def source():
+        yield 'a'
+        stall.wait(5)  # A stream that stops mid-answer
+        yield 'b'
+
+    start = time.monotonic()
+    events = list(iter_fan_out_stream(source(), lambda item: {item: lambda: item.upper()}, total_timeout=0.3))
+    stall.set()
+    assert time.monotonic() - start < 2
+    assert ('item', 'a') in events and ('result', ('a', 'A')) in events
+    assert ('item', 'b') not in events
+
+
+def test_async_stalled_source_is_bounded_by_the_total_deadline():
+    async def source():
+        yield 'a'
+        await asyncio.sleep(5)
+        yield 'b'
+
+    async def upper(item):
+        return item.upper()
+
+    async def collect():
+        return [event async for event in async_fan_out_stream(
+            source(), lambda item: {item: lambda: upper(item)}, total_timeout=0.3)]
+
+    start = time.monotonic()
+    events = asyncio.run(collect())
+    assert time.monotonic() - start < 2
+    assert events == [('item', 'a'), ('result', ('a', 'A'))]
+
+
+def test_call_started_before_the_deadline_maps_to_default_when_it_passes():
+    async def source():
+        yield 'a'
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def collect():
+        return [event async for event in async_fan_out_stream(
+            source(), lambda item: {item: slow}, total_timeout=0.2, default=[])]
+
+    assert asyncio.run(collect()) == [('item', 'a'), ('result', ('a', []))]
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from resilience import CircuitBreaker, CircuitOpenError, Upstream
+
+
+def half_open_upstream():
+    endpoint = Upstream('test', attempts=1, hedge=False)
+    endpoint.breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    endpoint.breaker.record_failure()
+    return endpoint
+
+
+def test_cancelled_async_probe_lets_the_next_call_probe():
+    endpoint = half_open_upstream()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def cancel_probe():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(endpoint.acall(hang), 0.01)
+
+    asyncio.run(cancel_probe())
+    assert endpoint.call(lambda: 'ok') == 'ok'
+    assert endpoint.breaker.state == 'closed'
+
+
+def test_interrupted_sync_probe_lets_the_next_call_probe():
+    endpoint = half_open_upstream()
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        endpoint.call(interrupted)
+    assert endpoint.call(lambda: 'ok') == 'ok'
+
+
+def test_abandoned_call_does_not_release_another_probe():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
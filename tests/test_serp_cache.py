@@ -0,0 +1,31 @@
+import serp_cache
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def test_error_statuses_are_retried_and_not_cached(monkeypatch):
+    responses = [FakeResponse(503, {'error': 'busy'}), FakeResponse(200, {'best_flights': []})]
+    monkeypatch.setattr(serp_cache.GoogleSearch, 'get_response', lambda self: responses.pop(0))
+    monkeypatch.setattr(serp_cache, 'serp_cache', serp_cache.TTLCache())
+    params = {'engine': 'google_flights', 'departure_id': 'SFO', 'arrival_id': 'ERR'}
+    assert serp_cache.cached_search(params) == {'best_flights': []}
+    assert not responses
+
+    # A rejected request is a failure rather than a result, and nothing is cached for it
+    monkeypatch.setattr(serp_cache, 'serp_cache', serp_cache.TTLCache())
+    monkeypatch.setattr(serp_cache, 'stale_cache', None)
+    monkeypatch.setattr(serp_cache.GoogleSearch, 'get_response',
+                        lambda self: FakeResponse(401, {'error': 'Invalid API key'}))
+    try:
+        serp_cache.cached_search(params)
+        assert False, "expected SerpApiError"
+    except serp_cache.SerpApiError as e:
+        assert e.code == 401
+    assert serp_cache._read_cache(serp_cache.params_key(params)) is None
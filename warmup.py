@@ -0,0 +1,256 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from datetime import datetime, date
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from rate_limit import TokenBucket
+from llm_cache import normalize_trip_type
+from metrics import configure_logging, set_trace_id
+
+logger = logging.getLogger(__name__)
+
+# Background warm-up of popular searches (off unless WARMUP_ENABLED=1)
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '0') == '1'
+WARMUP_CONFIG_PATH = os.getenv('WARMUP_CONFIG_PATH', 'warmup.json')
+WARMUP_HOURS = os.getenv('WARMUP_HOURS', '5-7')  # Local hours, end exclusive; may wrap past midnight
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 2))  # Searches running at once
+WARMUP_RATE = float(os.getenv('WARMUP_RATE', 1 / 30))  # Searches started per second
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', 20))
+WARMUP_MIN_COUNT = int(os.getenv('WARMUP_MIN_COUNT', 2))
+WARMUP_LOG_DAYS = int(os.getenv('WARMUP_LOG_DAYS', 14))
+WARMUP_CHECK_INTERVAL = float(os.getenv('WARMUP_CHECK_INTERVAL', 300))
+# Warmed results have to last from the off-peak window into peak hours
+WARMUP_RESULT_TTL = float(os.getenv('WARMUP_RESULT_TTL', 6 * 60 * 60))
+
+# Every search is appended here so popular ones can be learned; empty to disable. Off by
+# default unless the in-app warm-up is enabled (set it explicitly for the warmup.py sidecar)
+SEARCH_LOG_PATH = os.getenv('SEARCH_LOG_PATH', 'search_log.jsonl' if WARMUP_ENABLED else '')
+# Once the log reaches this size it is moved to SEARCH_LOG_PATH + '.1', replacing the older one
+SEARCH_LOG_MAX_BYTES = int(os.getenv('SEARCH_LOG_MAX_BYTES', 10 * 1024 * 1024))
+
+# Only the process holding this lock file runs the schedule, so it runs once per host however
+# many workers load the app; another process takes over if the holder exits
+WARMUP_LOCK_PATH = os.getenv('WARMUP_LOCK_PATH', 'warmup.lock')
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No cross-process lock (Windows): run the warm-up from the sidecar instead
+
+search_log_lock = threading.Lock()
+leader_lock = None  # The lock file, kept open while this process is the warm-up leader
+
+
+def log_search(params):
+    """Append a search's params to the search log"""
+    if not SEARCH_LOG_PATH:
+        return
+    line = json.dumps({'time': time.time(), **params})
+    try:
+        with search_log_lock:
+            if SEARCH_LOG_MAX_BYTES and os.path.exists(SEARCH_LOG_PATH) and \
+                    os.path.getsize(SEARCH_LOG_PATH) >= SEARCH_LOG_MAX_BYTES:
+                os.replace(SEARCH_LOG_PATH, SEARCH_LOG_PATH + '.1')
+            with open(SEARCH_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except OSError as e:
+        logger.warning(f"Failed to write search log: {str(e)}")
+
+
+def parse_hours(hours):
+    """Parse 'START-END' local hours into (start, end)"""
+    start, end = (int(part) for part in hours.split('-'))
+    return start, end
+
+
+def in_window(hours=WARMUP_HOURS, now=None):
+    """Whether ``now`` falls inside the off-peak window"""
+    start, end = parse_hours(hours)
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def month_dates(month, days, today=None):
+    """Travel dates for a config month ('YYYY-MM' or '+N' months from now) on the given days"""
+    today = today or date.today()
+    if month.startswith('+'):
+        index = today.year * 12 + today.month - 1 + int(month[1:])
+        year, month_number = divmod(index, 12)
+        month_number += 1
+    else:
+        year, month_number = (int(part) for part in month.split('-'))
+    dates = []
+    for day in days:
+        try:
+            travel_date = date(year, month_number, day)
+        except ValueError:
+            continue
+        if travel_date >= today:
+            dates.append(travel_date.strftime("%Y-%m-%d"))
+    return dates
+
+
+def load_config(path=WARMUP_CONFIG_PATH):
+    """Search tuples from the warm-up config.
+
+    The config is a JSON list of entries such as
+    {"vacation_type": "beach", "month": "+1", "days": [1, 15], "budget": 1000, "vacation_length": 7};
+    "travel_date" may be given instead of "month"/"days".
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    searches = []
+    for entry in entries:
+        if entry.get('travel_date'):
+            dates = [entry['travel_date']]
+        else:
+            dates = month_dates(str(entry.get('month', '+1')), entry.get('days', [1]))
+        for travel_date in dates:
+            search = {k: v for k, v in entry.items() if k not in ('month', 'days')}
+            search['travel_date'] = travel_date
+            searches.append(search)
+    return searches
+
+
+def learn_searches(path=SEARCH_LOG_PATH, top_n=WARMUP_TOP_N, min_count=WARMUP_MIN_COUNT, days=WARMUP_LOG_DAYS):
+    """The ``top_n`` searches repeated at least ``min_count`` times in the last ``days`` days of
+    the search log (and its rotated copy), skipping trips that have already departed"""
+    if not path:
+        return []
+    since = time.time() - days * 24 * 60 * 60
+    today = date.today().strftime("%Y-%m-%d")
+    counts = Counter()
+    for log_path in (path + '.1', path):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('time', 0) < since or (record.get('travel_date') or '') < today:
+                    continue
+                counts[json.dumps({k: v for k, v in record.items() if k != 'time'}, sort_keys=True)] += 1
+    return [json.loads(key) for key, count in counts.most_common(top_n) if count >= min_count]
+
+
+def popular_searches(config_path=WARMUP_CONFIG_PATH, log_path=SEARCH_LOG_PATH):
+    """Configured searches followed by learned ones, without duplicates"""
+    searches, seen = [], set()
+    for search in load_config(config_path) + learn_searches(log_path):
+        key = (normalize_trip_type(search.get('vacation_type')), json.dumps(
+            {k: v for k, v in search.items() if k != 'vacation_type'}, sort_keys=True))
+        if key not in seen:
+            seen.add(key)
+            searches.append(search)
+    return searches
+
+
+def run_warmup(warm, searches, concurrency=WARMUP_CONCURRENCY, rate=WARMUP_RATE, hours=None):
+    """Run ``warm(search)`` for each search, at most ``concurrency`` at once and ``rate`` starts
+    per second. With ``hours`` set, searches not yet started when the window closes are skipped."""
+    bucket = TokenBucket(rate, capacity=1)
+
+    def run(search):
+        set_trace_id()
+        try:
+            warm(search)
+            return True
+        except Exception as e:
+            logger.warning(f"Warm-up failed for {search}: {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for search in searches:
+            bucket.acquire()
+            if hours and not in_window(hours):
+                logger.info("Warm-up window closed, skipping the remaining searches")
+                break
+            futures.append(executor.submit(run, search))
+        warmed = sum(future.result() for future in futures)
+    logger.info(f"Warmed {warmed} of {len(searches)} searches")
+    return warmed
+
+
+def is_warmup_leader(path=WARMUP_LOCK_PATH):
+    """Whether this process runs the warm-up schedule, taking the lock file if no other process holds it"""
+    global leader_lock
+    if leader_lock is not None or fcntl is None or not path:
+        return True
+    try:
+        f = open(path, 'a')
+    except OSError as e:
+        logger.warning(f"Failed to open warm-up lock {path}: {str(e)}")
+        return False
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    # Held until the process exits, which releases it
+    leader_lock = f
+    logger.info(f"This process now runs the warm-up schedule (holds {path})")
+    return True
+
+
+def warmup_loop(warm, hours=WARMUP_HOURS):
+    """Warm the popular searches once per day, inside the off-peak window, if this process is
+    the warm-up leader"""
+    last_run = None
+    while True:
+        if in_window(hours) and last_run != date.today() and is_warmup_leader():
+            last_run = date.today()
+            try:
+                run_warmup(warm, popular_searches(), hours=hours)
+            except Exception as e:
+                logger.warning(f"Warm-up run failed: {str(e)}")
+        time.sleep(WARMUP_CHECK_INTERVAL)
+
+
+def start_warmup_thread(warm):
+    """Start the in-app warm-up scheduler if WARMUP_ENABLED is set. Every worker starts one, but
+    only the warm-up leader's runs searches (see is_warmup_leader)."""
+    if not WARMUP_ENABLED:
+        return None
+    thread = threading.Thread(target=warmup_loop, args=(warm,), daemon=True)
+    thread.start()
+    logger.info(f"Warm-up scheduler running during hours {WARMUP_HOURS}")
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute popular searches into the shared caches")
+    parser.add_argument('--config', default=WARMUP_CONFIG_PATH, help="JSON list of searches to warm")
+    parser.add_argument('--log', default=SEARCH_LOG_PATH,
+                        help="Search log to learn popular searches from (the app's SEARCH_LOG_PATH)")
+    parser.add_argument('--now', action='store_true', help="Run immediately instead of waiting for the off-peak window")
+    parser.add_argument('--dry-run', action='store_true', help="Print the searches without running them")
+    args = parser.parse_args()
+    configure_logging()
+
+    searches = popular_searches(args.config, args.log)
+    if args.dry_run:
+        print(json.dumps(searches, indent=2))
+        return
+
+    # A separate process only shares the persistent caches (destination suggestions, deals and
+    # SerpApi responses with SERP_CACHE_BACKEND=sqlite or redis), not the app's in-memory results
+    from app import warm_search
+    if args.now:
+        run_warmup(warm_search, searches)
+    else:
+        warmup_loop(warm_search)
+
+
+if __name__ == "__main__":
+    main()